@@ -1,23 +1,132 @@
-from cs50 import SQL
-from flask import Flask, flash, redirect, render_template, request, session, url_for, jsonify
-from flask_session import Session
-from werkzeug.security import check_password_hash, generate_password_hash
-from helpers import login_required, calculate_bmr_mifflin_st_jeor, calculate_bmr_katch_mcardle, calculate_tdee, validate_signup_data, calculate_age, validate_caloriehub_input, validate_traininghub_input, calculate_fitness_level, validate_progresshub_input, validate_settings_input, validate_edit_entry_input
-from datetime import datetime
+import os
+import sqlite3
+import sys
+
+import click
+from flask import Flask, Response, flash, redirect, render_template, request, session, stream_with_context, url_for, jsonify
+from database import Database
+from schema import migrate, audit_query_plans
+import progress_io
+from progress_io import detect_import_format, iter_csv_rows, iter_json_rows, import_weight_entries, export_weight_entries, fetch_weight_entries_page, EXPORT_FORMATS, PAGE_SIZE, MAX_PAGE_SIZE, MIN_DATE, MAX_DATE
+import chart_data
+from chart_data import weight_chart_series, CHART_POINTS, MAX_CHART_POINTS, PERIODS
+import trends
+from trends import update_trends, get_trend_summary, backfill_trends, backfill_trend_values
+import sessions
+from sessions import init_sessions
+from passwords import PasswordHasher, KDFBusy, DEFAULT_HASH_METHOD
+import usernames
+from usernames import UsernameIndex
+import profiles
+from profiles import ProfileCache
+import calories
+from calories import calorie_plan, write_calorie_report
+import strength
+from strength import StrengthIndex, strength_scores_batch, LIFTS
+import strength_log
+from strength_log import log_lifts, latest_lifts, lift_history
+from helpers import login_required, metrics_access_required, calculate_fitness_level
+from validation import SIGNUP_SCHEMA, CALORIEHUB_SCHEMA, SETTINGS_SCHEMA, WEIGHT_ENTRY_SCHEMA, EDIT_ENTRY_SCHEMA, TRAININGHUB_SCHEMA
+from dates import parse_iso_date, today_iso
+from fragments import init_fragments
+from caching import cache_policy, apply_cache_policy, PRIVATE
+from assets import init_assets, vendor_assets
+from images import init_images, build_images
+from instrumentation import init_instrumentation, PROMETHEUS_CONTENT_TYPE
+from profiling import init_profiler
 """ below only for debugging """
 
 # Configure application
 app = Flask(__name__)
 
 
-# Configure session to use filesystem (instead of signed cookies)
-app.config["SESSION_PERMANENT"] = False
-app.config["SESSION_TYPE"] = "filesystem"
-Session(app)
-
-
-# Configure CS50 Library to use SQLite database
-db = SQL("sqlite:///fithub.db")
+# Configure a bounded pool of SQLite connections (WAL mode, cached prepared statements)
+# FITHUB_DATABASE lets benchmarks / local experiments point the app at a copy of the database
+db = Database(
+    os.environ.get("FITHUB_DATABASE", "fithub.db"),
+    pool_size=int(os.environ.get("FITHUB_DB_POOL_SIZE", 8)),
+    busy_timeout_ms=int(os.environ.get("FITHUB_DB_BUSY_TIMEOUT_MS", 5000)),
+)
+
+# Bring the schema up to date (migration 3 also computes the trends of the existing entries),
+# then make sure every query in this file can use an index
+migrate(db, backfills={3: backfill_trend_values}, log=app.logger.warning)
+audit_query_plans(db, [__file__, progress_io.__file__, chart_data.__file__, trends.__file__, sessions.__file__, usernames.__file__, profiles.__file__, calories.__file__, strength.__file__, strength_log.__file__])
+
+# Username lookups for the signup form: Bloom filter + LRU in front of the unique index, warmed now
+username_index = UsernameIndex(db)
+username_index.warm()
+
+# Per-user profiles (users row + derived fields) for the hub routes, invalidated by settings()
+# Per process: other workers see a settings change after the TTL, the write routes read the row fresh
+profile_cache = ProfileCache(
+    db,
+    max_entries=int(os.environ.get("FITHUB_PROFILE_CACHE_SIZE", 1024)),
+    ttl=float(os.environ.get("FITHUB_PROFILE_CACHE_TTL", 300)),
+)
+
+# Sorted strength scores of all users for the traininghub percentile, refreshed incrementally
+strength_index = StrengthIndex(db)
+strength_index.refresh()
+
+
+# Configure password hashing in a bounded pool of worker processes (created before any other thread starts)
+# FITHUB_PASSWORD_HASH_METHOD sets the KDF and its work factor, FITHUB_KDF_WORKERS=0 hashes inline
+passwords = PasswordHasher(
+    workers=int(os.environ.get("FITHUB_KDF_WORKERS", 2)),
+    max_queue=int(os.environ.get("FITHUB_KDF_QUEUE", 16)),
+    queue_timeout=float(os.environ.get("FITHUB_KDF_QUEUE_TIMEOUT", 2)),
+    method=os.environ.get("FITHUB_PASSWORD_HASH_METHOD", DEFAULT_HASH_METHOD),
+)
+
+# Time every request, query, template render and KDF call (Prometheus text at /metrics)
+# Requests slower than FITHUB_SLOW_REQUEST_MS are logged with their breakdown, 0 turns the log off
+instrumentation = init_instrumentation(app, db, passwords, float(os.environ.get("FITHUB_SLOW_REQUEST_MS", 500)))
+instrumentation.add_collector("kdf", passwords.metrics)
+# The /metrics routes need Authorization: Bearer $FITHUB_METRICS_TOKEN if it is set, else they only answer local requests
+app.config["METRICS_TOKEN"] = os.environ.get("FITHUB_METRICS_TOKEN")
+
+# Opt-in cProfile of single requests into FITHUB_PROFILE_DIR (.prof + collapsed stacks for flame graphs):
+# requests with the header X-FitHub-Profile: $FITHUB_PROFILE_TOKEN, or a random FITHUB_PROFILE_SAMPLE_RATE share
+# of the requests to FITHUB_PROFILE_PATHS (comma separated prefixes); neither set = not installed at all
+profiler = init_profiler(
+    app,
+    directory=os.environ.get("FITHUB_PROFILE_DIR", "profiles"),
+    token=os.environ.get("FITHUB_PROFILE_TOKEN") or None,
+    sample_rate=float(os.environ.get("FITHUB_PROFILE_SAMPLE_RATE", 0)),
+    paths=tuple(path for path in os.environ.get("FITHUB_PROFILE_PATHS", "").split(",") if path),
+    keep=int(os.environ.get("FITHUB_PROFILE_KEEP", 100)),
+)
+
+
+# Configure sessions: "sqlite" (default, server-side in fithub.db), "memory" (single process) or "cookie" (signed cookies)
+# The cookie backend signs the sessions with FITHUB_SECRET_KEY and doesn't start without it
+# (a random key would log everybody out on every restart and differ between workers)
+app.config["SESSION_BACKEND"] = os.environ.get("FITHUB_SESSION_BACKEND", "sqlite")
+app.config["SESSION_TTL"] = int(os.environ.get("FITHUB_SESSION_TTL", 7 * 24 * 3600))  # seconds
+app.secret_key = os.environ.get("FITHUB_SECRET_KEY")
+init_sessions(app, db, app.config["SESSION_BACKEND"], app.config["SESSION_TTL"])
+
+
+# Cache the rendered static pages / modal partials and the compiled templates (on disk, shared by all workers)
+# FITHUB_JINJA_BYTECODE_CACHE=0 turns the bytecode cache off, FITHUB_JINJA_CACHE_DIR sets its directory
+fragments = init_fragments(
+    app,
+    bytecode_cache=os.environ.get("FITHUB_JINJA_BYTECODE_CACHE", "1") != "0",
+    bytecode_cache_dir=os.environ.get("FITHUB_JINJA_CACHE_DIR") or None,
+    max_entries=int(os.environ.get("FITHUB_FRAGMENT_CACHE_SIZE", 256)),
+)
+
+
+# Serve static files under content-hashed names with long-lived caching ({{ asset_url('styles.css') }} in templates)
+assets = init_assets(app)
+site_link_header = assets.link_header()
+
+# Resized AVIF / WebP / JPEG variants of the photos ({{ responsive_image(...) }} in templates, see flask build-images)
+images = init_images(app, assets)
+
+instrumentation.add_collector("profile_cache", profile_cache.stats)
+instrumentation.add_collector("fragment_cache", fragments.stats)
 
 
 @app.context_processor
@@ -39,13 +148,12 @@ def inject_hub_names():
 
 
 @app.after_request
-# Cache handling from flask.
+# Cache handling per route, see caching.py (no-store unless the route has a @cache_policy)
 def after_request(response):
-    """Ensure responses aren't cached"""
-    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-    response.headers["Expires"] = 0
-    response.headers["Pragma"] = "no-cache"
-    return response
+    """Set the caching headers (unchanged private pages become 304 Not Modified) and preload the site bundles"""
+    if response.status_code == 200 and response.mimetype == "text/html" and site_link_header:
+        response.headers.add("Link", site_link_header)
+    return apply_cache_policy(response)
 
 
 @app.route("/", defaults={"path": ""})
@@ -85,7 +193,8 @@ def check_username():
 
     This function handles POST requests to the /check_username URL.
     It retrieves the username from the form data and checks if a user with
-    that username exists in the database.
+    that username exists, through username_index (names the Bloom filter rules
+    out never reach the database).
 
     Returns:
     - A JSON (jsonify converts a Python dictionary into a JSON) indicating whether the username exists in the database.
@@ -93,9 +202,7 @@ def check_username():
         - {"exists": False} if the username is not found.
     """
     username = request.form.get("username")
-    user_exists = db.execute(
-        "SELECT * FROM users WHERE username = ?", username)
-    if user_exists:
+    if username and username_index.exists(username):
         return jsonify({"exists": True})
     return jsonify({"exists": False})
 
@@ -124,8 +231,8 @@ def login():
 
         # Check if the user exists and the password is correct
         # len(user) != 1: Ensures exactly one user is found with the given username
-        # check_password_hash: Verifies if the provided password matches the hashed password stored in the database
-        if len(user) != 1 or not check_password_hash(user[0]['hash_password'], password):
+        # passwords.verify: Verifies if the provided password matches the hashed password stored in the database
+        if len(user) != 1 or not passwords.verify(user[0]['hash_password'], password):
             flash("Invalid username or password.", "error")
             return render_template("login.html")
 
@@ -159,47 +266,49 @@ def signup():
             "body_fat_percentage": request.form.get("body_fat_percentage")
         }
 
-        # Handle empty body_fat_percentage as its optional and if not provided ends up as an empty string
-        if user_data['body_fat_percentage'] == "":
-            user_data['body_fat_percentage'] = None
-
-        # Perform validation
-        errors = validate_signup_data(**user_data)
+        # Perform validation (an empty body_fat_percentage counts as not provided), the values come back converted
+        values, errors = SIGNUP_SCHEMA.validate(user_data)
         if errors:
             for error in errors:
                 flash(error, "danger")
             return redirect(url_for('login'))
+        user_data.update(values)
+        user_data["birthday"] = values["birthday"].isoformat()
 
         # Convert to metric for storage if imperial and round to one decimal place
         if user_data["unit_system"] == "imperial":
             user_data["current_weight_kg"] = round(
-                float(user_data["current_weight_lb"]) * 0.453592, 1)
-            total_height_in_inches = (
-                float(user_data["height_ft"]) * 12) + float(user_data["height_in"])
+                user_data["current_weight_lb"] * 0.453592, 1)
+            total_height_in_inches = (user_data["height_ft"] * 12) + user_data["height_in"]
             user_data["height_cm"] = round(total_height_in_inches * 2.54, 1)
 
-        # Checking for username uniqueness
-        user_exists = db.execute(
-            "SELECT * FROM users WHERE username = ?", user_data["username"])
-        if user_exists:
-            logging.info("Username already taken.")
+        # Checking for username uniqueness (the unique index below catches a concurrent signup with the same name)
+        if username_index.exists(user_data["username"]):
             flash("Username already taken.", "warning")
             return redirect(url_for('login'))
 
+        # Hash outside the try below, a busy KDF pool is answered with 503 by password_hashing_busy
+        hashed_password = passwords.hash(user_data["password"])
+
         # Registering the user
         try:
-            hashed_password = generate_password_hash(user_data["password"])
             user_id = db.execute(
                 "INSERT INTO users (username, hash_password, unit_system, current_weight_kg, height_cm, birthday, gender, activity_level, body_fat_percentage) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
                 user_data["username"], hashed_password, user_data["unit_system"], user_data["current_weight_kg"], user_data[
                     "height_cm"], user_data["birthday"], user_data["gender"], user_data["activity_level"], user_data["body_fat_percentage"]
             )
 
+            username_index.add(user_data["username"])
+
             # Create session['user_id'] to use throughout the session
             session['user_id'] = user_id
             flash(
                 f"Created account successfully! Welcome, {user_data['username']}!", "success")
             return redirect("/home")
+        except sqlite3.IntegrityError:
+            username_index.add(user_data["username"])
+            flash("Username already taken.", "warning")
+            return redirect(url_for('login'))
         except Exception as e:
             flash("An error occurred during registration. Please try again.", "danger")
             return redirect(url_for('login'))
@@ -209,42 +318,31 @@ def signup():
 
 @app.route("/home")
 # Home route
+@cache_policy(PRIVATE)
 @login_required
 def home():
     """Show the homepage."""
-    return render_template("home.html")
+    return fragments.page("home.html")
 
 
 @app.route("/infohub")
 # Infohub route
+@cache_policy(PRIVATE)
 @login_required
 def infohub():
     """Show the infohub calculator page."""
-    return render_template("infohub.html")
+    return fragments.page("infohub.html")
 
 
 @app.route("/caloriehub", methods=["GET", "POST"])
 # Caloriehub route
+@cache_policy(PRIVATE)
 @login_required
 def caloriehub():
     user_id = session['user_id']
 
-    # Fetch user data from the database
-    user_data = db.execute('SELECT * FROM users WHERE id = ?', user_id)[0]
-    user_data['age'] = calculate_age(user_data['birthday'])
-
-    # Convert weight and height to imperial if necessary
-    if user_data['unit_system'] == 'imperial':
-        user_data['weight_lb'] = round(
-            user_data['current_weight_kg'] / 0.453592, 1)  # Round to nearest 0.1 lb
-        user_data['height_ft'] = round(
-            user_data['height_cm'] / 30.48)  # Round to nearest full ft
-        user_data['height_in'] = round(
-            (user_data['height_cm'] % 30.48) / 2.54)  # Round to nearest full in
-    else:
-        user_data['weight_lb'] = None
-        user_data['height_ft'] = None
-        user_data['height_in'] = None
+    # Fetch user data (incl. age and imperial weight / height) from the profile cache
+    user_data = profile_cache.get(user_id)
 
     return render_template("caloriehub.html", user_data=user_data)
 
@@ -267,127 +365,60 @@ def caloriehub_plans():
         'body_fat_percentage': request.form.get('body_fat_percentage')
     }
 
-    # Handle empty body_fat_percentage as its optional and if not provided ends up as an empty string    if user_data['body_fat_percentage'] == "":
-    if user_data['body_fat_percentage'] == "":
-        user_data['body_fat_percentage'] = None
-
-    # Validate input data
-    # ** passes in the dictionary at a whole and flask unpacks it so we can just use the variable names in the function rigth away instead of dict["key"] or dict.key
-    errors = validate_caloriehub_input(**user_data)
+    # Validate input data, the schema returns the converted values
+    values, errors = CALORIEHUB_SCHEMA.validate(user_data)
     if errors:
         flash("<br>".join(errors), 'danger')
         return redirect(url_for('caloriehub'))
 
     # Attempt to convert and calculate based on the unit system
-    if user_data['unit_system'] == 'metric':
-        weight = float(user_data['weight_kg'])
-        height = float(user_data['height_cm'])
-    elif user_data['unit_system'] == 'imperial':
-        weight = float(user_data['weight_lb']) * \
-            0.453592  # convert pounds to kg
+    if values['unit_system'] == 'metric':
+        weight = values['weight_kg']
+        height = values['height_cm']
+    elif values['unit_system'] == 'imperial':
+        weight = values['weight_lb'] * 0.453592  # convert pounds to kg
         # convert feet and inches to cm
-        height = (float(user_data['height_ft']) * 30.48) + \
-            (float(user_data['height_in']) * 2.54)
-
-    # Calculate BMR
-    if user_data['body_fat_percentage'] is not None:
-        bmr = calculate_bmr_katch_mcardle(
-            weight, float(user_data['body_fat_percentage']))
-    else:  # if its "None", hence not provided
-        bmr = calculate_bmr_mifflin_st_jeor(
-            weight, height, int(user_data['age']), user_data['gender'])
-
-    # Calculate TDEE for the user's provided activity level
-    tdee = calculate_tdee(bmr, user_data['activity_level'])
-
-    # Define activity levels for the table and user input section
-    activity_levels = {
-        'sedentary': "Little or no exercise",
-        'light': "Exercise/sports 1-3 days/week",
-        'moderate': "Exercise/sports 3-5 days/week",
-        'active': "Exercise/sports 6-7 days/week",
-        'very_active': "Exercise/sports & physical job or 2x training/day",
-    }
-
-    """
-    Retrieve the detailed activity level description for the user's activity level.
-    activity_levels.get(user_data['activity_level'], user_data['activity_level']) will:
-        1. Return the description if the activity level key exists in the activity_levels dictionary.
-        2. Use the activity level key itself as a fallback if it does not exist in the dictionary.
-        --> This ensures a meaningful value is always assigned to user_data['activity_level_description'].
-        --> either we get the description, or otherwise we return the key itself i.e. moderate
-        --> second user_data['activity_level'] is the fallback mechanism for the key itself
-    """
-    user_data['activity_level_description'] = activity_levels.get(
-        user_data['activity_level'], user_data['activity_level'])
-
-    # Create a dictionary to store TDEE (Total Daily Energy Expenditure) for different activity levels
-    tdee_activity_levels = {}
+        height = (values['height_ft'] * 30.48) + (values['height_in'] * 2.54)
 
-    # Loop through each activity level and its description
-    for level, description in activity_levels.items():
-        # Calculate TDEE for the current activity level using the BMR (Basal Metabolic Rate) and the activity level factor
-        tdee_value = calculate_tdee(bmr, level)
-
-        # Create a dictionary entry for the current activity level with its description and calculated TDEE
-        tdee_activity_levels[level] = {
-            "description": description,
-            "calories": f"{int(tdee_value)} cal/day"
-        }
-
-    diets = [
-        {
-            'id': 'maintenance',
-            'name': 'Maintenance',
-            'title': 'Your Maintenance Diets',
-            'description': f'Your maintenance diet helps you to maintain weight and uses <u><b>{int(tdee)} calories</u></b> per day.',
-            'calorie_adjustment': 0  # No adjustment for maintenance
-        },
-        {
-            'id': 'lose-weight',
-            'name': 'Lose Weight',
-            'title': 'Your Weight Loss Diets',
-            'description': f'Your weight loss diet helps you to lose weight by consuming <u><b>{int(tdee - 500)} calories</u></b> per day, which is <b><u>500 calories less than your maintenance level</u></b>. This deficit can help you lose body fat, as approximately 7,000 calories need to be burned over time to lose 1 kg of body fat.<br>',
-            'calorie_adjustment': -500  # -500 for weight loss
-        },
-        {
-            'id': 'build-muscle',
-            'name': 'Build Muscle',
-            'title': 'Your muscle-building Diets',
-            'description': f'Your muscle-building diet helps you gain muscle mass by consuming <u><b>{int(tdee + 200)} calories</u></b> per day, which is <b><u>200 calories more than your maintenance level</u></b>. To optimize muscle growth, it is generally recommended to maintain a slight calorie surplus.<br>',
-            'calorie_adjustment': +200  # + 200 for muscle building
-        }
-    ]
+    # BMR, TDEE per activity level and diet plans (memoized per quantized input, see calories.py)
+    plan = calorie_plan(weight, height, values['age'], values['gender'], values['activity_level'],
+                        values['body_fat_percentage'])
+    user_data['activity_level_description'] = plan.activity_level_description
 
     # Pass all data to the template
     return render_template('caloriehub_plans.html',
                            user_data=user_data,
-                           tdee=int(tdee),
-                           tdee_activity_levels=tdee_activity_levels,
-                           bmr=int(bmr),
-                           diets=diets
+                           tdee=plan.tdee,
+                           tdee_activity_levels=plan.tdee_activity_levels,
+                           bmr=plan.bmr,
+                           diets=plan.diets
                            )
 
 
 @app.route("/traininghub", methods=['GET', 'POST'])
 # traininghub route for creating custom workout plans
+@cache_policy(PRIVATE)
 @login_required
 def traininghub():
     user_id = session['user_id']
 
-    # Fetch user data from the database
-    user_data = db.execute('SELECT * FROM users WHERE id = ?', user_id)[0]
+    # Fetch user data from the profile cache (fresh when the lifts are stored, they're converted with unit_system)
+    user_data = profile_cache.get(user_id, fresh=request.method == 'POST')
     unit_system = user_data['unit_system']
-    current_weight_kg = user_data['current_weight_kg']
-    current_weight = round(current_weight_kg if unit_system ==
-                           'metric' else current_weight_kg / 0.453592, 1)
+    current_weight = user_data['current_weight_kg'] if unit_system == 'metric' else user_data['weight_lb']
+    gender = user_data['gender']
+
+    # Prefill the lifts with the last logged ones, in the user's unit system
+    factor = 1 / 0.453592 if unit_system == 'imperial' else 1
+    latest = {lift: None if weight_kg is None else round(weight_kg * factor, 1)
+              for lift, weight_kg in latest_lifts(db, user_id).items()}
 
     user_data = {
         'current_weight': current_weight,
         'unit_system': unit_system,
-        'squat': None,
-        'bench': None,
-        'deadlift': None,
+        'squat': latest['squat'],
+        'bench': latest['bench'],
+        'deadlift': latest['deadlift'],
     }
 
     if request.method == 'POST':
@@ -399,17 +430,14 @@ def traininghub():
             'deadlift': request.form.get('deadlift')
         })
 
-        # Validate input data
-        # ** passes in the dictionary at a whole and flask unpacks it so we can just use the variable names in the function rigth away instead of dict["key"] or dict.key
-        errors = validate_traininghub_input(**user_data)
+        # Validate input data, the schema returns the values as floats
+        values, errors = TRAININGHUB_SCHEMA.validate(user_data)
         if errors:
             flash("<br>".join(errors), 'danger')
             return render_template("traininghub.html", **user_data)
 
-        user_data['current_weight'] = float(user_data['current_weight'])
-        user_data['squat'] = float(user_data['squat'])
-        user_data['bench'] = float(user_data['bench'])
-        user_data['deadlift'] = float(user_data['deadlift'])
+        for field in ('current_weight', 'squat', 'bench', 'deadlift'):
+            user_data[field] = values[field]
 
         # Convert to kg if the unit system is imperial
         if unit_system == 'imperial':
@@ -424,35 +452,77 @@ def traininghub():
 
         # Calculate the fitness level based on the strength metrics
         user_data['fitness_level'] = calculate_fitness_level(
-            user_data['gender'], user_data['current_weight_kg'], user_data['squat'], user_data['bench'], user_data['deadlift'])
+            gender, user_data['current_weight_kg'], user_data['squat'], user_data['bench'], user_data['deadlift'])
+
+        # Log today's lifts and rank the lifter within the user base (binary search in the strength index)
+        score = float(strength_scores_batch(
+            [gender], [user_data['current_weight_kg']], [user_data['squat']], [user_data['bench']], [user_data['deadlift']])[0])
+        with db.transaction():
+            log_lifts(db, user_id, today_iso(),
+                      {lift: user_data[lift] for lift in LIFTS})
+            strength_index.record(user_id, score, user_data['fitness_level'])
+        percentiles = strength_index.percentiles([score], members=True)
+        user_data['percentile'] = None if percentiles is None else int(percentiles[0])
 
     # ** passes in the dictionary at a whole and flask unpacks it so we can just use the variable names in the function rigth away instead of dict["key"] or dict.key
     return render_template('traininghub.html', **user_data)
 
 
+@app.route('/traininghub/history')
+# JSON: estimated 1RM and trend per lift for the lift charts, downsampled to a point budget
+@cache_policy(PRIVATE)
+@login_required
+def training_history():
+    user_id = session['user_id']
+    lift = request.args.get('lift')
+    start = request.args.get('start') or MIN_DATE
+    end = request.args.get('end') or MAX_DATE
+    period = request.args.get('period', 'auto')
+
+    try:
+        max_points = int(request.args.get('points', CHART_POINTS))
+        for value in (start, end):
+            if value not in (MIN_DATE, MAX_DATE):
+                parse_iso_date(value)
+    except ValueError:
+        return jsonify({"error": "Invalid parameters. Dates must be YYYY-MM-DD and points a number."}), 400
+    if lift is not None and lift not in LIFTS:
+        return jsonify({"error": "Lift must be one of 'squat', 'bench' or 'deadlift'."}), 400
+    if not 3 <= max_points <= MAX_CHART_POINTS:
+        return jsonify({"error": f"Points must be between 3 and {MAX_CHART_POINTS}."}), 400
+    if period not in PERIODS:
+        return jsonify({"error": "Period must be one of 'auto', 'day', 'week' or 'month'."}), 400
+
+    unit_system = profile_cache.get(user_id)['unit_system']
+    lifts = [lift] if lift else list(LIFTS)
+
+    return jsonify(lift_history(db, user_id, unit_system, lifts, start, end, max_points, period)), 200
+
+
 @app.route('/progresshub', methods=['GET', 'POST'])
 # progresshub route lets user track their body weight progress over time
+@cache_policy(PRIVATE)
 @login_required
 def progresshub():
     user_id = session['user_id']
 
-    # Fetch the user's unit system
-    user_data = db.execute(
-        'SELECT unit_system FROM users WHERE id = ?', user_id)[0]
-    unit_system = user_data['unit_system']
+    # Fetch the user's unit system (fresh when a weight is stored, it's converted with it)
+    unit_system = profile_cache.get(user_id, fresh=request.method == 'POST')['unit_system']
 
     if request.method == 'POST':
         weight = request.form['weight']
         date_recorded = request.form.get(
-            'date_recorded', datetime.now().strftime('%Y-%m-%d'))
+            'date_recorded', today_iso())
 
         # Validate weight input
-        error = validate_progresshub_input(weight, unit_system, date_recorded)
-        if error:
-            flash(error, 'danger')
+        values, errors = WEIGHT_ENTRY_SCHEMA.validate(
+            {'weight': weight, 'unit_system': unit_system, 'date_recorded': date_recorded})
+        if errors:
+            flash("<br>".join(errors), 'danger')
             return redirect(url_for('progresshub'))
 
-        weight = float(weight)
+        weight = values['weight']
+        date_recorded = values['date_recorded'].isoformat()
 
         # Convert weight to kg if the unit is lb
         if unit_system == 'imperial':
@@ -461,37 +531,91 @@ def progresshub():
             # Ensure metric weight is also rounded to one decimal place
             weight_kg = round(weight, 1)
 
-        # Check if entry for this date already exists
-        existing_entry = db.execute(
-            'SELECT id FROM weight_entries WHERE user_id = ? AND date_recorded = ?', user_id, date_recorded)
-
-        if existing_entry:
-            db.execute('UPDATE weight_entries SET weight_kg = ? WHERE id = ?',
-                       weight_kg, existing_entry[0]['id'])
-            flash('Weight entry updated.', 'success')
-        else:
-            db.execute('INSERT INTO weight_entries (user_id, weight_kg, date_recorded) VALUES (?, ?, ?)',
-                       user_id, weight_kg, date_recorded)
+        # Insert the entry, or overwrite the weight if this date already has one, in a single atomic statement
+        # updated_at is only set by the conflict branch, so NULL means the row was just inserted
+        # The trend analytics are updated in the same transaction, only from this date onwards
+        with db.transaction():
+            entry = db.execute(
+                'INSERT INTO weight_entries (user_id, weight_kg, date_recorded) VALUES (?, ?, ?) '
+                'ON CONFLICT(user_id, date_recorded) DO UPDATE SET weight_kg = excluded.weight_kg, updated_at = CURRENT_TIMESTAMP '
+                'RETURNING updated_at',
+                user_id, weight_kg, date_recorded)[0]
+            update_trends(db, user_id, date_recorded)
+
+        if entry['updated_at'] is None:
             flash('Weight entry added.', 'success')
+        else:
+            flash('Weight entry updated.', 'success')
 
         return redirect(url_for('progresshub'))
 
-    # Always fetch and display existing data
-    entries = db.execute(
-        'SELECT id, weight_kg, date_recorded FROM weight_entries WHERE user_id = ? ORDER BY date_recorded', user_id)
+    # Only the newest page is rendered, the chart and table fetch everything else from the JSON APIs below
+    page = fetch_weight_entries_page(db, user_id, unit_system)
 
-    # Convert weights to user's preferred unit system for display
-    for entry in entries:
-        if unit_system == 'imperial':
-            # Round to one decimal place
-            entry['weight'] = round(entry['weight_kg'] / 0.453592, 1)
-            entry['unit'] = 'lb'
-        else:
-            # Round to one decimal place
-            entry['weight'] = round(entry['weight_kg'], 1)
-            entry['unit'] = 'kg'
+    # Precomputed trend analytics (single row per user, kept up to date on every write)
+    trend = get_trend_summary(db, user_id, unit_system)
 
-    return render_template('progresshub.html', entries=entries, current_date=datetime.now().strftime('%Y-%m-%d'), unit_system=unit_system)
+    return render_template('progresshub.html', entries=page['entries'], next_cursor=page['next_cursor'], trend=trend, current_date=today_iso(), unit_system=unit_system)
+
+
+@app.route('/progresshub/entries')
+# JSON API for the progresshub chart / table: one page of entries in a date range, keyset-paginated on (date, id)
+@cache_policy(PRIVATE)
+@login_required
+def progress_entries():
+    user_id = session['user_id']
+    start = request.args.get('start')
+    end = request.args.get('end')
+    after = request.args.get('after')
+    before = request.args.get('before')
+
+    try:
+        limit = int(request.args.get('limit', PAGE_SIZE))
+        for value in (start, end):
+            if value:
+                parse_iso_date(value)
+    except ValueError:
+        return jsonify({"error": "Invalid parameters. Dates must be YYYY-MM-DD and limit a number."}), 400
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify({"error": f"Limit must be between 1 and {MAX_PAGE_SIZE}."}), 400
+    if after and before:
+        return jsonify({"error": "Use either 'after' or 'before', not both."}), 400
+
+    unit_system = profile_cache.get(user_id)['unit_system']
+
+    try:
+        page = fetch_weight_entries_page(
+            db, user_id, unit_system, start=start, end=end, after=after, before=before, limit=limit)
+    except ValueError:
+        return jsonify({"error": "Invalid cursor."}), 400
+    return jsonify(page), 200
+
+
+@app.route('/progresshub/chart')
+# JSON API for the progresshub chart: the weights in a date range, downsampled to a point budget
+@cache_policy(PRIVATE)
+@login_required
+def progress_chart():
+    user_id = session['user_id']
+    start = request.args.get('start') or MIN_DATE
+    end = request.args.get('end') or MAX_DATE
+    period = request.args.get('period', 'auto')
+
+    try:
+        max_points = int(request.args.get('points', CHART_POINTS))
+        for value in (start, end):
+            if value not in (MIN_DATE, MAX_DATE):
+                parse_iso_date(value)
+    except ValueError:
+        return jsonify({"error": "Invalid parameters. Dates must be YYYY-MM-DD and points a number."}), 400
+    if not 3 <= max_points <= MAX_CHART_POINTS:
+        return jsonify({"error": f"Points must be between 3 and {MAX_CHART_POINTS}."}), 400
+    if period not in PERIODS:
+        return jsonify({"error": "Period must be one of 'auto', 'day', 'week' or 'month'."}), 400
+
+    unit_system = profile_cache.get(user_id)['unit_system']
+
+    return jsonify(weight_chart_series(db, user_id, unit_system, start, end, max_points, period)), 200
 
 
 @app.route('/delete_entry/<int:entry_id>', methods=['POST'])
@@ -499,9 +623,12 @@ def progresshub():
 @login_required
 def delete_entry(entry_id):
     user_id = session['user_id']
-    # Delete the entry if it belongs to the logged-in user
-    db.execute(
-        'DELETE FROM weight_entries WHERE id = ? AND user_id = ?', entry_id, user_id)
+    # Delete the entry if it belongs to the logged-in user, then update the trend from its date onwards
+    with db.transaction():
+        deleted = db.execute(
+            'DELETE FROM weight_entries WHERE id = ? AND user_id = ? RETURNING date_recorded', entry_id, user_id)
+        if deleted:
+            update_trends(db, user_id, deleted[0]['date_recorded'])
     flash('Weight entry deleted.', 'success')
     return redirect(url_for('progresshub'))
 
@@ -513,15 +640,16 @@ def edit_entry(entry_id):
     user_id = session['user_id']
     weight = request.form['weight']
     date_recorded = request.form['date_recorded']
-    unit_system = db.execute('SELECT unit_system FROM users WHERE id = ?', user_id)[
-        0]['unit_system']
+    unit_system = profile_cache.get(user_id, fresh=True)['unit_system']
 
-    # Validate weight input
-    error = validate_edit_entry_input(weight, unit_system)
-    if error:
-        return jsonify({"error": error}), 400
+    # Validate weight and date input
+    values, errors = EDIT_ENTRY_SCHEMA.validate(
+        {'weight': weight, 'unit_system': unit_system, 'date_recorded': date_recorded})
+    if errors:
+        return jsonify({"error": errors}), 400
 
-    weight = float(weight)
+    weight = values['weight']
+    date_recorded = values['date_recorded'].isoformat()
 
     # Convert weight to kg if the unit is lb
     if unit_system == 'imperial':
@@ -530,32 +658,102 @@ def edit_entry(entry_id):
         weight_kg = weight
 
     # Update the entry with the new weight and date
-    db.execute('UPDATE weight_entries SET weight_kg = ?, date_recorded = ? WHERE id = ?',
-               weight_kg, date_recorded, entry_id)
+    # (user_id, date_recorded) is unique, so moving an entry onto a day that already has one fails
+    try:
+        with db.transaction():
+            previous = db.execute(
+                'SELECT date_recorded FROM weight_entries WHERE id = ? AND user_id = ?', entry_id, user_id)
+            if not previous:
+                return jsonify({"error": "Weight entry not found."}), 404
+
+            db.execute('UPDATE weight_entries SET weight_kg = ?, date_recorded = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ? AND user_id = ?',
+                       weight_kg, date_recorded, entry_id, user_id)
+            # The trend has to be recomputed from whichever is earlier, the old or the new date
+            update_trends(db, user_id, min(previous[0]['date_recorded'], date_recorded))
+    except sqlite3.IntegrityError:
+        return jsonify({"error": "There is already a weight entry for this date."}), 400
     return jsonify({"message": "Weight entry updated successfully."}), 200
 
 
+@app.route('/progresshub/import', methods=['POST'])
+# Route to bulk import weight entries from a CSV or JSON file
+@login_required
+def import_entries():
+    user_id = session['user_id']
+    upload = request.files.get('file')
+    if upload is None or upload.filename == '':
+        return jsonify({"error": "Please choose a CSV or JSON file to import."}), 400
+
+    file_format = detect_import_format(upload.filename, request.form.get('format'))
+    if file_format is None:
+        return jsonify({"error": "Unsupported file type. Please upload a .csv or .json file."}), 400
+
+    unit_system = profile_cache.get(user_id, fresh=True)['unit_system']
+
+    # Rows are parsed lazily from the upload and written in chunks as they are validated
+    if file_format == 'csv':
+        rows = iter_csv_rows(upload.stream)
+    else:
+        rows = iter_json_rows(upload.stream)
+
+    # A file that breaks off half-way (bad encoding / JSON / CSV) keeps the valid rows before that
+    report = import_weight_entries(db, user_id, unit_system, rows)
+
+    # Recompute the trend analytics once for the whole import, from the earliest imported date
+    first_date = report.pop('first_date')
+    if first_date:
+        update_trends(db, user_id, first_date)
+
+    if report.pop('unreadable'):
+        error = "The file could not be read. Please check that it is valid CSV or JSON."
+        if report['imported']:
+            error += f"<br>The {report['imported']} valid weight entries before the unreadable part were imported."
+        return jsonify({"error": error, **report}), 400
+
+    message = f"Imported {report['imported']} weight entries."
+    if report['rejected']:
+        rejected_rows = ", ".join(str(error['row']) for error in report['errors'][:10])
+        message += f"<br>{report['rejected']} rows were skipped because they are invalid (rows {rejected_rows}"
+        message += ", ...)." if report['rejected'] > 10 else ")."
+    return jsonify({"message": message, **report}), 200
+
+
+@app.route('/progresshub/export')
+# Route to download the user's weight history as CSV (default) or NDJSON
+@login_required
+def export_entries():
+    user_id = session['user_id']
+    file_format = request.args.get('format', 'csv').lower()
+    if file_format not in EXPORT_FORMATS:
+        return jsonify({"error": "Unsupported export format. Use 'csv' or 'ndjson'."}), 400
+
+    unit_system = profile_cache.get(user_id)['unit_system']
+
+    # The generator reads and converts one row at a time while the response is being sent
+    return Response(
+        stream_with_context(export_weight_entries(db, user_id, unit_system, file_format)),
+        mimetype=EXPORT_FORMATS[file_format],
+        headers={"Content-Disposition": f"attachment; filename=fithub_weight_entries.{file_format}"})
+
+
 @app.route("/settings", methods=["GET", "POST"])
+@cache_policy(PRIVATE)
 @login_required
 def settings():
     user_id = session['user_id']
 
     if request.method == "GET":
-        user_data = db.execute("SELECT * FROM users WHERE id = ?", user_id)[0]
-        # we simply calculate this below as
+        user_data = profile_cache.get(user_id)
+        # the profile always carries the imperial values as
         #   1) if the unit system is imperial we need the data
         #   2) if the unit system is metric but the user changes to imperial, it should auto convert the current value.
-        current_weight_lb = round(user_data['current_weight_kg'] / 0.453592, 1)
-        total_height_in_inches = round(user_data['height_cm'] / 2.54)
-        height_ft = int(total_height_in_inches // 12)
-        height_in = int(total_height_in_inches % 12)
 
         # Create a dictionary to pass to the template
         template_data = {
             'user_data': user_data,
-            'current_weight_lb': current_weight_lb,
-            'height_ft': height_ft,
-            'height_in': height_in
+            'current_weight_lb': user_data['weight_lb'],
+            'height_ft': user_data['height_ft'],
+            'height_in': user_data['height_in']
         }
 
         # ** passes in the dictionary at a whole and flask unpacks it so we can just use the variable names in the function rigth away instead of dict["key"] or dict.key
@@ -575,29 +773,27 @@ def settings():
             'height_in': request.form.get("height_in")
         }
 
-        # Handle empty body_fat_percentage as its optional and if not provided ends up as an empty string
-        if user_data['body_fat_percentage'] == "":
-            user_data['body_fat_percentage'] = None
-
-        # Validate input data
-        # ** passes in the dictionary at a whole and flask unpacks it so we can just use the variable names in the function rigth away instead of dict["key"] or dict.key
-        errors = validate_settings_input(**user_data)
+        # Validate input data (an empty body_fat_percentage counts as not provided), the values come back converted
+        values, errors = SETTINGS_SCHEMA.validate(user_data)
         if errors:
             flash("<br>".join(errors), "danger")
             return redirect(url_for('settings'))
+        user_data.update(values)
+        user_data['birthday'] = values['birthday'].isoformat()
 
         # Convert to metric for storage if imperial and round to one decimal place
         if user_data['unit_system'] == 'imperial':
             user_data['current_weight_kg'] = round(
-                float(user_data['current_weight_lb']) * 0.453592, 1)
+                user_data['current_weight_lb'] * 0.453592, 1)
             user_data['height_cm'] = round(
-                (float(user_data['height_ft']) * 30.48) + (float(user_data['height_in']) * 2.54), 1)
+                (user_data['height_ft'] * 30.48) + (user_data['height_in'] * 2.54), 1)
 
         db.execute(
             "UPDATE users SET unit_system = ?, current_weight_kg = ?, height_cm = ?, birthday = ?, gender = ?, activity_level = ?, body_fat_percentage = ? WHERE id = ?",
             user_data['unit_system'], user_data['current_weight_kg'], user_data['height_cm'], user_data[
                 'birthday'], user_data['gender'], user_data['activity_level'], user_data['body_fat_percentage'], user_id
         )
+        profile_cache.invalidate(user_id)
 
         flash("Settings updated successfully!", "success")
         return redirect(url_for('settings'))
@@ -612,10 +808,11 @@ def change_password():
     new_password = request.form.get("new_password")
     confirm_password = request.form.get("confirm_password")
 
-    user_data = db.execute("SELECT * FROM users WHERE id = ?", user_id)[0]
+    # The password hash isn't part of the cached profile, read it fresh
+    user_data = db.execute("SELECT hash_password FROM users WHERE id = ?", user_id)[0]
 
     # Validate current password
-    if not check_password_hash(user_data['hash_password'], current_password):
+    if not passwords.verify(user_data['hash_password'], current_password):
         flash("Current password is incorrect.", "danger")
         return redirect(url_for('settings'))
 
@@ -625,14 +822,51 @@ def change_password():
         return redirect(url_for('settings'))
 
     # Update password
-    new_password_hash = generate_password_hash(new_password)
-    db.execute("UPDATE users SET password = ? WHERE id = ?",
+    new_password_hash = passwords.hash(new_password)
+    db.execute("UPDATE users SET hash_password = ? WHERE id = ?",
                new_password_hash, user_id)
 
     flash("Password updated successfully.", "success")
     return redirect(url_for('settings'))
 
 
+@app.errorhandler(KDFBusy)
+# All password hashing workers and queue slots are taken: fail fast instead of piling up requests
+def password_hashing_busy(error):
+    flash("FitHub is very busy right now, please try again in a moment.", "warning")
+    if request.endpoint == 'change_password':
+        return redirect(url_for('settings'))
+    return render_template("login.html"), 503, {"Retry-After": "2"}
+
+
+@app.route("/metrics")
+# Request / query / template / KDF timings and the cache counters for Prometheus, see metrics_access_required
+@metrics_access_required
+def metrics():
+    return Response(instrumentation.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@app.route("/metrics/kdf")
+# Password hashing queue depth and latency, see metrics_access_required
+@metrics_access_required
+def kdf_metrics():
+    return jsonify(passwords.metrics())
+
+
+@app.route("/metrics/profiles")
+# Profile cache hit / miss counters, see metrics_access_required
+@metrics_access_required
+def profile_cache_metrics():
+    return jsonify(profile_cache.stats())
+
+
+@app.route("/metrics/fragments")
+# Fragment cache hit / miss counters, see metrics_access_required
+@metrics_access_required
+def fragment_cache_metrics():
+    return jsonify(fragments.stats())
+
+
 @app.route("/logout")
 # Logout route
 @login_required
@@ -646,6 +880,49 @@ def logout():
     return redirect("/")
 
 
+@app.cli.command("backfill-trends")
+# flask backfill-trends: compute the progresshub trend analytics for all existing weight entries
+def backfill_trends_command():
+    """Recompute trend weights and summaries for every user."""
+    users = backfill_trends(db)
+    print(f"Trend analytics backfilled for {users} users.")
+
+
+@app.cli.command("calorie-report")
+@click.option("--output", type=click.Path(dir_okay=False, writable=True), help="CSV file to write, default stdout")
+@click.option("--chunk-size", default=10000, show_default=True, help="Users processed per chunk")
+# flask calorie-report: BMR by every formula, TDEE and diet targets for all users, streamed in chunks
+def calorie_report_command(output, chunk_size):
+    """Write the nightly calorie report for every user as CSV."""
+    if output:
+        with open(output, "w", newline="", encoding="utf-8") as file:
+            users = write_calorie_report(db, file, chunk_size)
+        print(f"Calorie report for {users} users written to {output}.")
+    else:
+        write_calorie_report(db, sys.stdout, chunk_size)
+
+
+@app.cli.command("vendor-assets")
+@click.option("--force", is_flag=True, help="Download files that are already vendored again")
+# flask vendor-assets: copy the pinned front-end libraries into static/vendor/ (needs network access once)
+def vendor_assets_command(force):
+    """Download Bootstrap, Bootstrap Icons and Chart.js into static/vendor/ for the asset bundles."""
+    for path, integrity in vendor_assets(app.static_folder, force).items():
+        print(f"{integrity}  {path}")
+    print("Pin the hashes that are None in assets.VENDOR_FILES, commit static/vendor/ and restart the app.")
+
+
+@app.cli.command("build-images")
+# flask build-images: resize the photos into static/img/ (needs Pillow, run again after replacing a photo)
+def build_images_command():
+    """Generate the responsive AVIF / WebP / JPEG variants and placeholders of the photos."""
+    try:
+        build_images(app.static_folder)
+    except RuntimeError as error:
+        raise click.ClickException(str(error))
+    print("Restart the app to pick up the new variants.")
+
+
 if __name__ == "__main__":
     app.run(debug=True)
 
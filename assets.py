@@ -0,0 +1,274 @@
+"""
+This module is FitHub's front-end asset pipeline: vendored libraries, bundles and content-hashed URLs.
+
+    - the third-party libraries (Bootstrap, Bootstrap Icons, Chart.js and its plugins) are pinned in
+      VENDOR_FILES and committed in static/vendor/ (fetched with `flask vendor-assets`), under the same
+      path as on the CDN, so no page depends on outbound network access
+    - at startup every static file is hashed, styles.css becomes styles.<hash>.css, and the BUNDLES are
+      built in memory: the CSS is concatenated (url()s rewritten to the hashed files) and minified, the
+      JS is concatenated from the libraries' minified builds
+    - templates link bundles with {{ asset_tags('site.css') }} / {{ preload_tags('charts.js') }} and single
+      files with {{ asset_url('styles.css') }}, all served from /assets/<hashed name> with
+      Cache-Control: immutable; a changed file gets a new name (and URL) on the next start
+    - every HTML page gets a Link: rel=preload header for the site bundles, so the browser (or a proxy
+      sending 103 Early Hints) fetches them before it has parsed the page
+    - chart libraries are separate bundles, only the chart pages load them
+    - a bundle with a library that isn't vendored falls back to the CDN URLs of its files (with a warning),
+      with their integrity hash where one is pinned
+    - the plain /static/<name> URLs keep working with revalidation (ETag / Last-Modified)
+"""
+import base64
+import hashlib
+import os
+import posixpath
+import re
+import urllib.request
+
+from flask import Response, abort, send_from_directory
+from markupsafe import Markup, escape
+
+from caching import IMMUTABLE, IMMUTABLE_MAX_AGE, cache_policy
+
+HASH_LENGTH = 12    # hex digits of the SHA-256 content hash in the file name
+ASSETS_URL_PATH = "/assets"
+VENDOR_DIRECTORY = "vendor"
+CDN_URL = "https://cdn.jsdelivr.net/npm/"
+
+# Third-party files, path below static/vendor/ (= below the CDN URL) -> Subresource Integrity hash
+# (None: not vendored and pinned yet, `flask vendor-assets` prints the hashes of what it downloaded)
+VENDOR_FILES = {
+    "bootstrap@5.3.3/dist/css/bootstrap.min.css":
+        "sha384-QWTKZyjpPEjISv5WaRU9OFeRpok6YctnYmDr5pNlyT2bRjXh0JMhjY6hW+ALEwIH",
+    "bootstrap@5.3.3/dist/js/bootstrap.bundle.min.js":
+        "sha384-YvpcrYf0tY3lHB60NNkmXc5s9fDVZLESaAA55NDzOxhy9GkcIdslK1eN7N6jIeHz",
+    "bootstrap-icons@1.11.3/font/bootstrap-icons.min.css":
+        "sha384-XGjxtQfXaH2tnPFa9x+ruJTuLE3Aa6LhHSWRr1XeTyhezb4abCG4ccI5AkVDxqC+",
+    "bootstrap-icons@1.11.3/font/fonts/bootstrap-icons.woff2":
+        "sha384-QV+/zNG6sFIQ/qAWRxaR4sjpF37wr046d3pTS5QlogmJfbmyeiWip4YIIGmdK4pa",
+    "bootstrap-icons@1.11.3/font/fonts/bootstrap-icons.woff":
+        "sha384-jiOBsoZ7OEMAq7BXRR05+D5H/5Lna7TAlXVGHhkfH68p5P1eKJTeI4KCIOfBzG/O",
+    "chart.js@4.4.3/dist/chart.umd.js": None,
+    "chartjs-adapter-date-fns@3.0.0/dist/chartjs-adapter-date-fns.bundle.min.js": None,
+    "hammerjs@2.0.8/hammer.min.js": None,
+    "chartjs-plugin-zoom@2.0.1/dist/chartjs-plugin-zoom.min.js": None,
+}
+
+# Bundle name -> files below static/, in load order
+BUNDLES = {
+    "site.css": ["vendor/bootstrap@5.3.3/dist/css/bootstrap.min.css",
+                 "vendor/bootstrap-icons@1.11.3/font/bootstrap-icons.min.css",
+                 "styles.css"],
+    "site.js": ["vendor/bootstrap@5.3.3/dist/js/bootstrap.bundle.min.js"],
+    "charts.js": ["vendor/chart.js@4.4.3/dist/chart.umd.js",
+                  "vendor/chartjs-adapter-date-fns@3.0.0/dist/chartjs-adapter-date-fns.bundle.min.js"],
+    "charts-zoom.js": ["vendor/hammerjs@2.0.8/hammer.min.js",
+                       "vendor/chartjs-plugin-zoom@2.0.1/dist/chartjs-plugin-zoom.min.js"],
+}
+# Bundles every page needs (preloaded with the Link header)
+SITE_BUNDLES = ("site.css", "site.js")
+
+MIMETYPES = {".css": "text/css; charset=utf-8", ".js": "text/javascript; charset=utf-8"}
+
+CSS_COMMENT = re.compile(r"/\*(?!!).*?\*/", re.S)                 # keeps /*! license */ comments
+CSS_SPACE = re.compile(r"\s+")
+CSS_PUNCTUATION_SPACE = re.compile(r"\s*([{};,>])\s*")
+CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+SOURCE_MAP_COMMENT = re.compile(r"^[/*#@\s]*sourceMappingURL=.*$", re.M)
+
+
+def fingerprint(filename, content):
+    """styles.css + content -> styles.<hash>.css"""
+    stem, extension = os.path.splitext(filename)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:HASH_LENGTH]}{extension}"
+
+
+def minify_css(css):
+    """Drop comments (except /*! license */ ones) and insignificant whitespace."""
+    css = CSS_COMMENT.sub("", css)
+    css = CSS_SPACE.sub(" ", css)
+    return CSS_PUNCTUATION_SPACE.sub(r"\1", css).replace(";}", "}").strip()
+
+
+def subresource_integrity(content):
+    return "sha384-" + base64.b64encode(hashlib.sha384(content).digest()).decode()
+
+
+class AssetManifest:
+    """
+    Content-hashed names of the files in a directory and the bundles built from them, built once.
+
+    Parameters:
+    directory (str): The static folder
+    static_url_path (str): URL path of the plain static files
+    """
+
+    def __init__(self, directory, static_url_path="/static"):
+        self.directory = directory
+        self.static_url_path = static_url_path
+        self._hashed = {}       # file / bundle name (relative, '/' separated) -> hashed name
+        self._files = {}        # hashed name -> file name
+        self._bundles = {}      # hashed name -> bundle content (bytes)
+        self.missing = []       # vendored files that aren't there, see init_assets
+        self.build()
+
+    def build(self):
+        hashed, files = {}, {}
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                filename = os.path.relpath(path, self.directory).replace(os.sep, "/")
+                with open(path, "rb") as file:
+                    hashed[filename] = fingerprint(filename, file.read())
+                files[hashed[filename]] = filename
+        self._hashed, self._files = hashed, files
+
+        bundles, self.missing = {}, sorted(
+            f"{VENDOR_DIRECTORY}/{path}" for path in VENDOR_FILES if f"{VENDOR_DIRECTORY}/{path}" not in hashed)
+        for name, parts in BUNDLES.items():
+            if any(part not in hashed for part in parts):
+                continue
+            content = self._build_bundle(name, parts)
+            hashed[name] = fingerprint(name, content)
+            bundles[hashed[name]] = content
+        self._bundles = bundles
+
+    def _build_bundle(self, name, parts):
+        sources = []
+        for part in parts:
+            with open(os.path.join(self.directory, part), encoding="utf-8") as file:
+                source = SOURCE_MAP_COMMENT.sub("", file.read())
+            if name.endswith(".css"):
+                source = CSS_URL.sub(lambda match: f"url({self._rewrite_url(part, match.group(2))})", source)
+            sources.append(source)
+        if name.endswith(".css"):
+            return minify_css("\n".join(sources)).encode()
+        # The libraries are vendored as minified builds, ';' keeps one file's last statement out of the next
+        return "\n;\n".join(source.strip() for source in sources).encode()
+
+    def _rewrite_url(self, part, url):
+        """A url() relative to a bundled CSS file -> the hashed URL of the file it points to."""
+        if re.match(r"^([a-z]+:|/|#)", url):
+            return url
+        path = posixpath.normpath(posixpath.join(posixpath.dirname(part), url.split("?")[0].split("#")[0]))
+        hashed_name = self._hashed.get(path)
+        return f"{ASSETS_URL_PATH}/{hashed_name}" if hashed_name else url
+
+    def hashed_name(self, filename):
+        """Hashed name of a static file or bundle, None if it isn't in the manifest."""
+        return self._hashed.get(filename)
+
+    def resolve(self, hashed_name):
+        """File name for a hashed name, None for unknown (e.g. outdated) names."""
+        return self._files.get(hashed_name)
+
+    def bundle(self, hashed_name):
+        """Content of a built bundle, None if the hashed name isn't one."""
+        return self._bundles.get(hashed_name)
+
+    def url(self, filename):
+        """Jinja global asset_url: the immutable URL of a static file or bundle (plain /static/ URL if it's unknown)."""
+        hashed_name = self._hashed.get(filename)
+        if hashed_name is None:
+            return f"{self.static_url_path}/{filename}"
+        return f"{ASSETS_URL_PATH}/{hashed_name}"
+
+    def _sources(self, bundle):
+        """(url, integrity) per file to load for a bundle: the bundle itself, or its files with CDN fallbacks."""
+        if bundle in self._hashed:
+            return [(self.url(bundle), None)]
+        sources = []
+        for part in BUNDLES[bundle]:
+            vendor_path = part.removeprefix(f"{VENDOR_DIRECTORY}/")
+            if part not in self._hashed and vendor_path in VENDOR_FILES:
+                sources.append((CDN_URL + vendor_path, VENDOR_FILES[vendor_path]))
+            else:
+                sources.append((self.url(part), None))
+        return sources
+
+    def tags(self, bundle):
+        """Jinja global asset_tags: <link> / <script> tags that load a bundle."""
+        tags = []
+        for url, integrity in self._sources(bundle):
+            attributes = f' integrity="{integrity}" crossorigin="anonymous"' if integrity else ""
+            if bundle.endswith(".css"):
+                tags.append(f'<link href="{escape(url)}" rel="stylesheet"{attributes}>')
+            else:
+                tags.append(f'<script src="{escape(url)}"{attributes}></script>')
+        return Markup("\n".join(tags))
+
+    def preload_tags(self, bundle):
+        """Jinja global preload_tags: <link rel="preload"> for a bundle that is loaded further down the page."""
+        kind = "style" if bundle.endswith(".css") else "script"
+        return Markup("\n".join(
+            f'<link rel="preload" href="{escape(url)}" as="{kind}"'
+            + (f' integrity="{integrity}" crossorigin="anonymous">' if integrity else ">")
+            for url, integrity in self._sources(bundle)))
+
+    def link_header(self, bundles=SITE_BUNDLES):
+        """Link header value preloading bundles, None while they fall back to the CDN."""
+        if any(bundle not in self._hashed for bundle in bundles):
+            return None
+        return ", ".join(
+            f"<{self.url(bundle)}>; rel=preload; as={'style' if bundle.endswith('.css') else 'script'}"
+            for bundle in bundles)
+
+
+def vendor_assets(directory, force=False, log=print):
+    """
+    Download the pinned VENDOR_FILES from the CDN into static/vendor/ and check their integrity.
+
+    Parameters:
+    directory (str): The static folder
+    force (bool): Download files that are already there again
+
+    Returns:
+    dict: Path -> Subresource Integrity hash of every vendored file
+
+    Raises:
+    ValueError: A download doesn't match its pinned integrity hash
+    """
+    hashes = {}
+    for path, integrity in VENDOR_FILES.items():
+        target = os.path.join(directory, VENDOR_DIRECTORY, *path.split("/"))
+        if os.path.exists(target) and not force:
+            with open(target, "rb") as file:
+                content = file.read()
+        else:
+            with urllib.request.urlopen(CDN_URL + path, timeout=30) as response:
+                content = response.read()
+            if integrity and subresource_integrity(content) != integrity:
+                raise ValueError(f"{path} doesn't match its integrity hash {integrity}")
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as file:
+                file.write(content)
+            log(f"vendored {path} ({len(content)} bytes)" + ("" if integrity else ", not pinned yet"))
+        hashes[path] = subresource_integrity(content)
+    return hashes
+
+
+def init_assets(app):
+    """
+    Fingerprint the app's static folder, build the bundles and register /assets/<hashed name>,
+    the template helpers and the Link header.
+
+    Returns:
+    AssetManifest: The manifest
+    """
+    manifest = AssetManifest(app.static_folder, app.static_url_path)
+    if manifest.missing:
+        app.logger.warning("%d vendored asset(s) missing, loading them from the CDN (run `flask vendor-assets`): %s",
+                           len(manifest.missing), ", ".join(manifest.missing))
+
+    @cache_policy(IMMUTABLE)
+    def asset(filename):
+        content = manifest.bundle(filename)
+        if content is not None:
+            return Response(content, content_type=MIMETYPES[os.path.splitext(filename)[1]])
+        source = manifest.resolve(filename)
+        if source is None:
+            abort(404)
+        return send_from_directory(app.static_folder, source, max_age=IMMUTABLE_MAX_AGE)
+
+    app.add_url_rule(f"{ASSETS_URL_PATH}/<path:filename>", "asset", asset)
+    app.jinja_env.globals.update(asset_url=manifest.url, asset_tags=manifest.tags, preload_tags=manifest.preload_tags)
+    return manifest
@@ -0,0 +1,90 @@
+"""
+Micro-benchmark of the caloriehub plan computation.
+
+Compares the per-call cost of
+    - inline:   what caloriehub_plans() used to do per request (BMR, six TDEE calls, rebuilding the
+                activity / diet dicts and description strings)
+    - cold:     calories.calorie_plan() with an empty memo (every input computed once)
+    - warm:     calories.calorie_plan() for inputs already in the memo
+
+Inputs are drawn from a realistic spread of weights, heights and ages; with --distinct the
+number of different users is set (fewer distinct inputs -> more memo hits in real traffic).
+
+Usage:
+    python benchmarks/bench_calories.py
+    python benchmarks/bench_calories.py --calls 200000 --distinct 500
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from calories import ACTIVITY_LEVELS, DIET_PLANS, _calorie_plan, calorie_plan  # noqa: E402
+from helpers import calculate_bmr_katch_mcardle, calculate_bmr_mifflin_st_jeor, calculate_tdee  # noqa: E402
+
+
+def inline_plan(weight, height, age, gender, activity_level, body_fat_percentage):
+    """The computation as it used to run inside the route."""
+    if body_fat_percentage is not None:
+        bmr = calculate_bmr_katch_mcardle(weight, body_fat_percentage)
+    else:
+        bmr = calculate_bmr_mifflin_st_jeor(weight, height, age, gender)
+    tdee = calculate_tdee(bmr, activity_level)
+    activity_levels = dict(ACTIVITY_LEVELS)
+    description = activity_levels.get(activity_level, activity_level)
+    tdee_activity_levels = {}
+    for level, level_description in activity_levels.items():
+        tdee_activity_levels[level] = {
+            "description": level_description,
+            "calories": f"{int(calculate_tdee(bmr, level))} cal/day",
+        }
+    diets = [
+        {'id': diet_id, 'name': name, 'title': title,
+         'description': text.format(calories=int(tdee + adjustment)), 'calorie_adjustment': adjustment}
+        for diet_id, name, title, text, adjustment in DIET_PLANS
+    ]
+    return int(bmr), int(tdee), description, tdee_activity_levels, diets
+
+
+def make_inputs(distinct, seed=1):
+    rng = random.Random(seed)
+    users = []
+    for _ in range(distinct):
+        body_fat = round(rng.uniform(8, 35), 1) if rng.random() < 0.3 else None
+        users.append((round(rng.uniform(50, 120), 1), round(rng.uniform(150, 200), 1), rng.randint(16, 70),
+                      rng.choice(("male", "female")), rng.choice(list(ACTIVITY_LEVELS)), body_fat))
+    return users
+
+
+def per_call(function, inputs, calls):
+    started = time.perf_counter()
+    for i in range(calls):
+        function(*inputs[i % len(inputs)])
+    return (time.perf_counter() - started) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=100000)
+    parser.add_argument("--distinct", type=int, default=1000, help="different inputs in the workload")
+    args = parser.parse_args()
+
+    inputs = make_inputs(args.distinct)
+
+    inline = per_call(inline_plan, inputs, args.calls)
+    _calorie_plan.cache_clear()
+    cold = per_call(calorie_plan, inputs, len(inputs))
+    warm = per_call(calorie_plan, inputs, args.calls)
+
+    print(f"{'variant':<8} {'µs/call':>9}")
+    for name, seconds in (("inline", inline), ("cold", cold), ("warm", warm)):
+        print(f"{name:<8} {seconds * 1e6:9.2f}")
+    print(f"memo: {_calorie_plan.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Benchmark the bytes a browser downloads for the static hub pages (as a logged-in user).
+
+    - fetches each page through the test client and every stylesheet, script and image it references
+    - images are resolved like a browser does: the first <source> of a <picture> (AVIF, then WebP),
+      the candidate of its srcset that covers the sizes slot at the viewport's device pixel ratio
+    - one row per page and viewport: HTML / CSS / JS / image bytes and the total; files that would come
+      from a CDN (libraries that aren't vendored yet) can't be measured offline and are only counted
+    - fonts referenced by the CSS are left out, they are only fetched when a glyph is used
+
+Run it before and after `flask build-images` (and `flask vendor-assets`) to compare.
+
+Usage:
+    python benchmarks/bench_page_weight.py
+    python benchmarks/bench_page_weight.py --page /home --viewport 390x3
+"""
+import argparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+from html.parser import HTMLParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = ["/home", "/infohub"]
+VIEWPORTS = ["390x3", "768x2", "1440x1"]    # CSS px width x device pixel ratio
+ROOT_FONT_SIZE = 16                         # px per rem / em
+
+
+class Resources(HTMLParser):
+    """Collects the stylesheets, scripts and images of a page, per kind."""
+
+    def __init__(self):
+        super().__init__()
+        self.found = []             # (kind, url or candidates)
+        self._picture = None        # candidates of the chosen <source>, while inside a <picture>
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "link" and attrs.get("rel") == "stylesheet":
+            self.found.append(("css", attrs["href"]))
+        elif tag == "script" and attrs.get("src"):
+            self.found.append(("js", attrs["src"]))
+        elif tag == "picture":
+            self._picture = []
+        elif tag == "source" and self._picture == []:
+            self._picture = [(attrs["srcset"], attrs.get("sizes", "100vw"))]
+        elif tag == "img":
+            if self._picture:
+                self.found.append(("img", self._picture[0]))
+            elif attrs.get("srcset"):
+                self.found.append(("img", (attrs["srcset"], attrs.get("sizes", "100vw"))))
+            else:
+                self.found.append(("img", attrs["src"]))
+
+    def handle_endtag(self, tag):
+        if tag == "picture":
+            self._picture = None
+
+
+LENGTH_TOKEN = re.compile(r"\s*(?:(\d+(?:\.\d+)?)(px|vw|rem|em)|(\d+(?:\.\d+)?)|(calc\(|[()*/+-]))")
+
+
+def css_length(expression, viewport):
+    """
+    Evaluate a sizes length in CSS px: px, vw, rem and em lengths, plain numbers and
+    calc() with + - * / and parentheses.
+    """
+    units = {"px": 1, "vw": viewport / 100, "rem": ROOT_FONT_SIZE, "em": ROOT_FONT_SIZE}
+    tokens, position, expression = [], 0, expression.strip()
+    while position < len(expression):
+        match = LENGTH_TOKEN.match(expression, position)
+        if match is None:
+            raise ValueError(f"unsupported sizes length: {expression}")
+        length, unit, number, symbol = match.groups()
+        tokens.append(float(length) * units[unit] if length else float(number) if number else symbol)
+        position = match.end()
+    tokens.append(None)
+
+    def take():
+        return tokens.pop(0)
+
+    # Recursive descent: sum := product (('+' | '-') product)*, product := factor (('*' | '/') factor)*
+    def factor():
+        token = take()
+        if token in ("(", "calc("):
+            value = total()
+            if take() != ")":
+                raise ValueError(f"unbalanced parentheses: {expression}")
+            return value
+        if token == "-":
+            return -factor()
+        if isinstance(token, float):
+            return token
+        raise ValueError(f"unsupported sizes length: {expression}")
+
+    def product():
+        value = factor()
+        while tokens[0] in ("*", "/"):
+            value = value * factor() if take() == "*" else value / factor()
+        return value
+
+    def total():
+        value = product()
+        while tokens[0] in ("+", "-"):
+            value = value + product() if take() == "+" else value - product()
+        return value
+
+    value = total()
+    if tokens != [None]:
+        raise ValueError(f"unsupported sizes length: {expression}")
+    return value
+
+
+def slot_width(sizes, viewport):
+    """The width the sizes attribute gives the image at a viewport width."""
+    for entry in sizes.split(","):
+        match = re.fullmatch(r"\s*\((min|max)-width:\s*(\d+)px\)\s*(.+)", entry)
+        if match is None:
+            return css_length(entry, viewport)
+        limit = int(match[2])
+        if (match[1] == "min" and viewport >= limit) or (match[1] == "max" and viewport <= limit):
+            return css_length(match[3], viewport)
+    return viewport
+
+
+def pick_candidate(srcset, sizes, viewport, ratio):
+    """The srcset candidate a browser downloads: the smallest one covering the slot, else the largest."""
+    candidates = sorted((int(width[:-1]), url) for url, width in (item.split() for item in srcset.split(",")))
+    needed = slot_width(sizes, viewport) * ratio
+    return next((url for width, url in candidates if width >= needed), candidates[-1][1])
+
+
+def page_weight(client, page, viewport, ratio, sizes_cache):
+    html = client.get(page).data
+    parser = Resources()
+    parser.feed(html.decode())
+    weight = {"html": len(html), "css": 0, "js": 0, "img": 0, "cdn": 0}
+    for kind, source in parser.found:
+        url = source if isinstance(source, str) else pick_candidate(*source, viewport, ratio)
+        if url.startswith(("http://", "https://", "//")):
+            weight["cdn"] += 1
+            continue
+        if url not in sizes_cache:
+            sizes_cache[url] = len(client.get(url).data)
+        weight[kind] += sizes_cache[url]
+    return weight
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page", action="append", help="Page to weigh (repeatable, default: /home and /infohub)")
+    parser.add_argument("--viewport", action="append", help="WIDTHxRATIO, e.g. 390x3 (repeatable)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="fithub-bench-")
+    shutil.copyfile(os.path.join(ROOT, "fithub.db"), os.path.join(workdir, "fithub.db"))
+    os.environ["FITHUB_DATABASE"] = os.path.join(workdir, "fithub.db")
+    os.environ.setdefault("FITHUB_KDF_WORKERS", "0")
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+    import app as fithub
+
+    try:
+        client, sizes_cache = fithub.app.test_client(), {}
+        with client.session_transaction() as session:
+            session["user_id"] = 1
+        print(f"{'page':<8} {'viewport':>9} {'html kB':>8} {'css kB':>8} {'js kB':>8} {'img kB':>8} {'total kB':>9} {'cdn':>4}")
+        for page in args.page or PAGES:
+            for viewport in args.viewport or VIEWPORTS:
+                width, ratio = (int(value) for value in viewport.split("x"))
+                weight = page_weight(client, page, width, ratio, sizes_cache)
+                total = sum(weight[kind] for kind in ("html", "css", "js", "img"))
+                print(f"{page:<8} {viewport:>9} " + " ".join(f"{weight[kind] / 1024:8.1f}" for kind in ("html", "css", "js", "img"))
+                      + f" {total / 1024:9.1f} {weight['cdn']:4}")
+        print(f"\nresponsive images built: {', '.join(fithub.images.manifest) or 'none (run flask build-images)'}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark the rendering of the static hub pages.
+
+    - per page: /home and /infohub rendered with render_template on every call (before) vs. served
+      from the fragment cache (after), both inside a request context of a logged-in user
+    - cold start: loading every template in a fresh Jinja environment, compiling from source vs.
+      from a warm bytecode cache (what a newly started worker does)
+
+Usage:
+    python benchmarks/bench_render.py
+    python benchmarks/bench_render.py --calls 5000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = ["home.html", "infohub.html"]
+
+
+def per_call(function, calls):
+    started = time.perf_counter()
+    for _ in range(calls):
+        function()
+    return (time.perf_counter() - started) / calls
+
+
+def cold_load(bytecode_cache_dir=None):
+    """Seconds to load every template into a fresh environment."""
+    from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+    env = Environment(loader=FileSystemLoader(os.path.join(ROOT, "templates")),
+                      bytecode_cache=FileSystemBytecodeCache(bytecode_cache_dir) if bytecode_cache_dir else None)
+    started = time.perf_counter()
+    for name in env.list_templates(extensions=["html"]):
+        env.get_template(name)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--cold-runs", type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="fithub-bench-")
+    shutil.copyfile(os.path.join(ROOT, "fithub.db"), os.path.join(workdir, "fithub.db"))
+    os.environ["FITHUB_DATABASE"] = os.path.join(workdir, "fithub.db")
+    os.environ.setdefault("FITHUB_KDF_WORKERS", "0")
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+    import app as fithub
+    from flask import render_template, session
+
+    try:
+        print(f"{'page':<14} {'render µs':>10} {'cached µs':>10} {'speedup':>8}")
+        for page in PAGES:
+            with fithub.app.test_request_context(f"/{page[:-5]}"):
+                session["user_id"] = 1
+                assert render_template(page) == fithub.fragments.page(page)
+                before = per_call(lambda: render_template(page), args.calls)
+                after = per_call(lambda: fithub.fragments.page(page), args.calls)
+            print(f"{page:<14} {before * 1e6:10.1f} {after * 1e6:10.1f} {before / after:7.0f}x")
+
+        bytecode_dir = os.path.join(workdir, "jinja-cache")
+        os.mkdir(bytecode_dir)
+        cold_load(bytecode_dir)  # fill the bytecode cache
+        source = min(cold_load() for _ in range(args.cold_runs))
+        cached = min(cold_load(bytecode_dir) for _ in range(args.cold_runs))
+        print(f"\ncold template load: {source * 1e3:.1f} ms from source, {cached * 1e3:.1f} ms from bytecode cache")
+        print(f"fragment cache: {fithub.fragments.stats()}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
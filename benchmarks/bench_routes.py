@@ -0,0 +1,105 @@
+"""
+Benchmark requests/second on the database-heavy hub routes.
+
+Runs /progresshub and /caloriehub through Flask's test client from several threads against a
+throw-away copy of the database seeded with one user and a long weight history.
+
+To compare with the old CS50 SQL handle, benchmark a checkout of the baseline with --root (the
+modules of this tree need the pooled layer, swapping the handle in isn't possible).
+
+Usage:
+    python benchmarks/bench_routes.py
+    python benchmarks/bench_routes.py --threads 8 --requests 2000 --entries 5000
+    git worktree add /tmp/fithub-baseline <baseline commit>    # needs pip install cs50 flask-session
+    python benchmarks/bench_routes.py --root /tmp/fithub-baseline
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROUTES = ["/progresshub", "/caloriehub"]
+
+
+def seed_database(root, path, entries):
+    """Copy the schema from root's fithub.db and add one user with `entries` daily weight logs."""
+    shutil.copyfile(os.path.join(root, "fithub.db"), path)
+    conn = sqlite3.connect(path)
+    user_id = conn.execute(
+        "INSERT INTO users (username, hash_password, unit_system, current_weight_kg, height_cm, birthday, gender, activity_level, body_fat_percentage) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        ("bench", "x", "metric", 80.0, 180.0, "1990-01-01", "male", "moderate", None)).lastrowid
+    start = date.today() - timedelta(days=entries)
+    conn.executemany(
+        "INSERT INTO weight_entries (user_id, weight_kg, date_recorded) VALUES (?, ?, ?)",
+        ((user_id, 80.0 + (i % 7) * 0.1, (start + timedelta(days=i)).isoformat()) for i in range(entries)))
+    conn.commit()
+    conn.close()
+    return user_id
+
+
+def run(client_factory, user_id, route, threads, requests_per_thread):
+    """Hit `route` from `threads` threads and return requests/second."""
+    barrier = threading.Barrier(threads + 1)
+    errors = []
+
+    def worker():
+        client = client_factory()
+        with client.session_transaction() as sess:
+            sess["user_id"] = user_id
+        barrier.wait()
+        for _ in range(requests_per_thread):
+            response = client.get(route)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for worker_thread in workers:
+        worker_thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for worker_thread in workers:
+        worker_thread.join()
+    elapsed = time.perf_counter() - started
+
+    if errors:
+        raise SystemExit(f"{route}: {len(errors)} requests failed, e.g. HTTP {errors[0]}")
+    return threads * requests_per_thread / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", default=ROOT, help="tree whose app.py is benchmarked (default: this one)")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=500, help="requests per thread")
+    parser.add_argument("--entries", type=int, default=1000, help="weight entries for the benchmark user")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="fithub-bench-")
+    db_path = os.path.join(workdir, "fithub.db")
+    user_id = seed_database(args.root, db_path, args.entries)
+
+    # app.py reads these at import time; run from the temp dir so session files land there too
+    # (the baseline has no FITHUB_DATABASE and opens fithub.db in the working directory)
+    os.environ["FITHUB_DATABASE"] = db_path
+    os.chdir(workdir)
+    sys.path.insert(0, os.path.abspath(args.root))
+    import app as fithub
+
+    try:
+        print(f"root={args.root} threads={args.threads} requests/thread={args.requests} entries={args.entries}")
+        for route in ROUTES:
+            run(fithub.app.test_client, user_id, route, 1, 20)  # warm-up
+            rate = run(fithub.app.test_client, user_id, route, args.threads, args.requests)
+            print(f"{route:<16} {rate:10.1f} req/s")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
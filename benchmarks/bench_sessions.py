@@ -0,0 +1,117 @@
+"""
+Benchmark the per-request overhead of each session backend.
+
+A tiny Flask app is run through the test client twice per backend: one route only reads the
+session (a logged-in page view), one writes to it (like a flash message). The time of the same
+requests with a do-nothing session interface is subtracted, what remains is the session cost.
+
+Usage:
+    python benchmarks/bench_sessions.py
+    python benchmarks/bench_sessions.py --requests 5000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from flask import Flask, session
+from flask.sessions import SessionInterface, SessionMixin
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from database import Database  # noqa: E402
+from schema import migrate  # noqa: E402
+from sessions import init_sessions  # noqa: E402
+
+
+class NoSession(dict, SessionMixin):
+    modified = False
+
+
+class NoSessionInterface(SessionInterface):
+    """Baseline: a plain dict, nothing loaded or saved."""
+
+    def open_session(self, app, request):
+        return NoSession(user_id=1)
+
+    def save_session(self, app, session, response):
+        pass
+
+
+def make_app(backend, db):
+    app = Flask(__name__)
+    app.secret_key = "benchmark"
+
+    @app.route("/login")
+    def login():
+        session["user_id"] = 1
+        return ""
+
+    @app.route("/read")
+    def read():
+        return str(session.get("user_id"))
+
+    @app.route("/write")
+    def write():
+        session["_flashes"] = [("success", "Weight entry added.")]
+        return ""
+
+    if backend == "none":
+        app.session_interface = NoSessionInterface()
+    elif backend == "filesystem":
+        from flask_session import Session
+        app.config["SESSION_TYPE"] = "filesystem"
+        app.config["SESSION_FILE_DIR"] = tempfile.mkdtemp(prefix="fithub-bench-sessions-")
+        Session(app)
+    else:
+        init_sessions(app, db, backend, ttl=3600, gc_interval=0)
+    return app
+
+
+def time_requests(app, route, requests, rounds=5):
+    """Seconds per request for `route` with a logged-in client, best of `rounds` to filter out noise."""
+    client = app.test_client()
+    client.get("/login")
+    for _ in range(50):  # warm-up
+        client.get(route)
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(requests):
+            client.get(route)
+        best = min(best, (time.perf_counter() - started) / requests)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000, help="requests per round")
+    args = parser.parse_args()
+
+    # Throw-away copy of the database for the sqlite backend
+    db_path = os.path.join(tempfile.mkdtemp(prefix="fithub-bench-"), "fithub.db")
+    shutil.copyfile(os.path.join(ROOT, "fithub.db"), db_path)
+    db = Database(db_path)
+    migrate(db)
+
+    backends = ["sqlite", "memory", "cookie"]
+    try:
+        import flask_session  # noqa: F401
+        backends.insert(0, "filesystem")  # the old Flask-Session setup, for comparison
+    except ImportError:
+        pass
+
+    baseline = {route: time_requests(make_app("none", db), route, args.requests) for route in ("/read", "/write")}
+    print(f"{'backend':<12} {'read µs/req':>12} {'write µs/req':>13}")
+    for backend in backends:
+        app = make_app(backend, db)
+        read = (time_requests(app, "/read", args.requests) - baseline["/read"]) * 1e6
+        write = (time_requests(app, "/write", args.requests) - baseline["/write"]) * 1e6
+        print(f"{backend:<12} {read:12.1f} {write:13.1f}")
+
+
+if __name__ == "__main__":
+    main()
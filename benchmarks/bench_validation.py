@@ -0,0 +1,96 @@
+"""
+Micro-benchmark of the form validation.
+
+Measures the per-form cost of every schema in validation.py, for a valid submission
+and for one that fails most rules. With --legacy REV the old validate_* helpers are loaded
+from helpers.py at that git revision and timed on the same forms for comparison.
+
+Usage:
+    python benchmarks/bench_validation.py
+    python benchmarks/bench_validation.py --calls 200000 --legacy <commit before the schemas>
+"""
+import argparse
+import inspect
+import os
+import subprocess
+import sys
+import time
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from validation import (CALORIEHUB_SCHEMA, EDIT_ENTRY_SCHEMA, SETTINGS_SCHEMA, SIGNUP_SCHEMA,  # noqa: E402
+                        TRAININGHUB_SCHEMA, WEIGHT_ENTRY_SCHEMA)
+
+# (form, schema, legacy helper name, valid form, invalid form)
+FORMS = (
+    ("signup", SIGNUP_SCHEMA, "validate_signup_data",
+     dict(username="lifter", password="secret", confirmed_password="secret", birthday="1990-05-17", gender="male",
+          activity_level="moderate", unit_system="metric", current_weight_kg="82.5", height_cm="181",
+          current_weight_lb=None, height_ft=None, height_in=None, body_fat_percentage="18"),
+     dict(username="lifter", password="secret", confirmed_password="other", birthday="17.05.1990", gender="male",
+          activity_level="moderate", unit_system="imperial", current_weight_lb="500", height_ft="9",
+          height_in="14", current_weight_kg=None, height_cm=None, body_fat_percentage="120")),
+    ("caloriehub", CALORIEHUB_SCHEMA, "validate_caloriehub_input",
+     dict(unit_system="imperial", weight_kg=None, weight_lb="182", height_cm=None, height_ft="5", height_in="11",
+          age="34", gender="female", activity_level="light", body_fat_percentage=None),
+     dict(unit_system="metric", weight_kg="250", weight_lb=None, height_cm="90", height_ft=None, height_in=None,
+          age="9", gender="other", activity_level="couch", body_fat_percentage="-3")),
+    ("settings", SETTINGS_SCHEMA, "validate_settings_input",
+     dict(unit_system="metric", current_weight_kg="70", height_cm="172", current_weight_lb=None, height_ft=None,
+          height_in=None, birthday="1985-11-02", gender="female", activity_level="active", body_fat_percentage=None),
+     dict(unit_system="imperial", current_weight_kg=None, height_cm=None, current_weight_lb="40", height_ft="2",
+          height_in="5", birthday="2020-01-01", gender="x", activity_level="x", body_fat_percentage="abc")),
+    ("progresshub", WEIGHT_ENTRY_SCHEMA, "validate_progresshub_input",
+     dict(weight="81.4", unit_system="metric", date_recorded="2024-03-01"),
+     dict(weight="900", unit_system="metric", date_recorded="2024/03/01")),
+    ("edit_entry", EDIT_ENTRY_SCHEMA, "validate_edit_entry_input",
+     dict(weight="180", unit_system="imperial", date_recorded="2024-03-01"),
+     dict(weight="20", unit_system="imperial", date_recorded="2999-01-01")),
+    ("traininghub", TRAININGHUB_SCHEMA, "validate_traininghub_input",
+     dict(current_weight="82", squat="140", bench="100", deadlift="180", unit_system="metric"),
+     dict(current_weight="25", squat="-10", bench="100", deadlift="600", unit_system="metric")),
+)
+
+
+def load_legacy(revision):
+    """helpers.py at a git revision as a module, for its validate_* functions."""
+    source = subprocess.run(["git", "show", f"{revision}:helpers.py"], cwd=ROOT, check=True,
+                            capture_output=True, text=True).stdout
+    module = types.ModuleType("legacy_helpers")
+    exec(compile(source, f"{revision}:helpers.py", "exec"), module.__dict__)
+    return module
+
+
+def per_call(function, form, calls):
+    started = time.perf_counter()
+    for _ in range(calls):
+        function(form)
+    return (time.perf_counter() - started) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=50000)
+    parser.add_argument("--legacy", metavar="REV", help="git revision with the old validate_* helpers")
+    args = parser.parse_args()
+
+    legacy = load_legacy(args.legacy) if args.legacy else None
+
+    print(f"{'form':<12} {'case':<8} {'errors':>6} {'schema µs':>10}" + (f" {'legacy µs':>10}" if legacy else ""))
+    for name, schema, legacy_name, valid, invalid in FORMS:
+        for case, form in (("valid", valid), ("invalid", invalid)):
+            errors = len(schema.validate(form)[1])
+            line = f"{name:<12} {case:<8} {errors:>6} {per_call(schema.validate, form, args.calls) * 1e6:10.2f}"
+            if legacy:
+                function = getattr(legacy, legacy_name)
+                # The old helpers take only the fields they knew about (edit_entry had no date)
+                parameters = inspect.signature(function).parameters
+                arguments = {field: value for field, value in form.items() if field in parameters}
+                line += f" {per_call(lambda form: function(**arguments), form, args.calls) * 1e6:10.2f}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
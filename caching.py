@@ -0,0 +1,66 @@
+"""
+This module sets the HTTP caching headers per route.
+
+Routes choose a policy with @cache_policy, everything else keeps the safe default:
+    - NO_STORE (default): never cached (forms, POST results, redirects, exports, metrics)
+    - PRIVATE: pages / JSON of the logged-in user, only the browser may keep them and must revalidate;
+      the response gets an ETag from its body, so an unchanged page is answered with 304 Not Modified
+    - IMMUTABLE: content-hashed static files (see assets.py), cached for a year without revalidation
+Flask's own /static/ route keeps its revalidation headers (ETag / Last-Modified from send_file).
+"""
+from flask import current_app, request
+
+NO_STORE = "no-store"
+PRIVATE = "private"
+IMMUTABLE = "immutable"
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600     # seconds
+
+# Endpoints whose views can't carry the attribute (Flask's static files) and their policy, None = leave as is
+ENDPOINT_POLICIES = {"static": None}
+
+
+def cache_policy(policy):
+    """
+    Decorate routes with their caching policy (put it above @login_required, so the registered view has it).
+
+    Parameters:
+    policy (str): NO_STORE, PRIVATE or IMMUTABLE
+    """
+    def decorator(f):
+        f.cache_policy = policy
+        return f
+    return decorator
+
+
+def apply_cache_policy(response):
+    """
+    Set the caching headers of a response by the policy of its route.
+
+    Returns:
+    Response: The response, for PRIVATE routes possibly turned into a 304
+    """
+    if request.endpoint in ENDPOINT_POLICIES:
+        policy = ENDPOINT_POLICIES[request.endpoint]
+    else:
+        view = current_app.view_functions.get(request.endpoint)
+        policy = getattr(view, "cache_policy", NO_STORE)
+
+    if policy is None:
+        return response
+    cacheable = request.method in ("GET", "HEAD") and response.status_code in (200, 304)
+
+    if policy == IMMUTABLE and cacheable:
+        response.headers["Cache-Control"] = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+        return response
+
+    if policy == PRIVATE and cacheable and not response.is_streamed:
+        response.headers["Cache-Control"] = "private, no-cache"
+        response.vary.add("Cookie")
+        response.add_etag()
+        return response.make_conditional(request)
+
+    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
+    response.headers["Expires"] = 0
+    response.headers["Pragma"] = "no-cache"
+    return response
@@ -0,0 +1,357 @@
+"""
+This module computes the caloriehub plans: BMR, TDEE for every activity level and the diet plans.
+It also has NumPy batch variants of the formulas for reports over all users.
+
+The result only depends on a handful of numbers (weight, height, age, gender, body fat and
+activity level), so it is a pure function of them:
+    - the descriptions, activity factors and diet definitions are module-level tables
+    - inputs are quantized (0.1 kg, 0.1 cm, whole years, 0.1 % body fat) and the plan for each
+      quantized input is memoized in a bounded LRU
+    - the returned CaloriePlan is frozen, so a cached plan can be shared between requests safely
+    - every diet carries its macro splits (calories and grams per macro); the pie charts only depend
+      on the split percentages, so they are rendered once as inline SVG at import
+"""
+import csv
+import math
+from dataclasses import dataclass
+from functools import lru_cache
+from types import MappingProxyType
+
+import numpy as np
+
+import dates
+from helpers import ACTIVITY_FACTORS, calculate_bmr_katch_mcardle, calculate_bmr_mifflin_st_jeor
+
+CALORIE_PLAN_CACHE_SIZE = 4096
+MACRO_SPLITS_CACHE_SIZE = 8192  # whole calories per day, a few thousand distinct targets in practice
+REPORT_CHUNK_SIZE = 10000   # users per chunk in the cohort report
+
+REPORT_USERS_SQL = (
+    "SELECT id, birthday, gender, activity_level, current_weight_kg, height_cm, body_fat_percentage "
+    "FROM users WHERE id > ? ORDER BY id LIMIT ?"
+)
+
+# Activity levels for the table and user input section
+ACTIVITY_LEVELS = MappingProxyType({
+    'sedentary': "Little or no exercise",
+    'light': "Exercise/sports 1-3 days/week",
+    'moderate': "Exercise/sports 3-5 days/week",
+    'active': "Exercise/sports 6-7 days/week",
+    'very_active': "Exercise/sports & physical job or 2x training/day",
+})
+
+# (id, name, title, description with {calories}, calorie adjustment to the maintenance TDEE)
+DIET_PLANS = (
+    ('maintenance', 'Maintenance', 'Your Maintenance Diets',
+     'Your maintenance diet helps you to maintain weight and uses <u><b>{calories} calories</u></b> per day.',
+     0),  # No adjustment for maintenance
+    ('lose-weight', 'Lose Weight', 'Your Weight Loss Diets',
+     'Your weight loss diet helps you to lose weight by consuming <u><b>{calories} calories</u></b> per day, which is <b><u>500 calories less than your maintenance level</u></b>. This deficit can help you lose body fat, as approximately 7,000 calories need to be burned over time to lose 1 kg of body fat.<br>',
+     -500),  # -500 for weight loss
+    ('build-muscle', 'Build Muscle', 'Your muscle-building Diets',
+     'Your muscle-building diet helps you gain muscle mass by consuming <u><b>{calories} calories</u></b> per day, which is <b><u>200 calories more than your maintenance level</u></b>. To optimize muscle growth, it is generally recommended to maintain a slight calorie surplus.<br>',
+     +200),  # + 200 for muscle building
+)
+
+# Macro -> (label, kcal per gram, pie / legend color); 'carbs-or-fat' is free to split, so it has no grams
+MACROS = MappingProxyType({
+    'protein': ('Protein', 4, '#007bff'),
+    'carbs': ('Carbs', 4, '#ffc107'),
+    'fat': ('Fat', 9, '#28a745'),
+    'carbs-or-fat': ('Carbs or Fat', None, '#e83e8c'),
+})
+
+# (id, name, ((macro, percent of the diet's calories), ...)), shown for every diet plan
+MACRO_SPLITS = (
+    ('smart-fithub', 'Smart FitHub Diet', (('protein', 30), ('carbs-or-fat', 70))),
+    ('low-carb', 'Low Carb Diet', (('protein', 30), ('carbs', 25), ('fat', 45))),
+    ('low-fat', 'Low Fat Diet', (('protein', 30), ('carbs', 50), ('fat', 20))),
+)
+
+PIE_SIZE = 75   # px
+
+
+def macro_pie_svg(shares, size=PIE_SIZE):
+    """
+    Render a pie chart of macro percentages as an inline SVG (clockwise from 12 o'clock, like Chart.js).
+
+    Parameters:
+    shares (tuple): (macro, percent) pairs adding up to 100
+    size (int): Width and height in px
+
+    Returns:
+    str: The <svg> element
+    """
+    label = ", ".join(f"{percent}% {MACROS[macro][0].lower()}" for macro, percent in shares)
+    slices, start = [], 0
+    for macro, percent in shares:
+        end = start + percent
+        if percent >= 100:
+            slices.append(f'<circle cx="16" cy="16" r="16" fill="{MACROS[macro][2]}"/>')
+        elif percent > 0:
+            x1, y1 = 16 + 16 * math.sin(start * math.pi / 50), 16 - 16 * math.cos(start * math.pi / 50)
+            x2, y2 = 16 + 16 * math.sin(end * math.pi / 50), 16 - 16 * math.cos(end * math.pi / 50)
+            slices.append(f'<path d="M16 16L{x1:.3f} {y1:.3f}A16 16 0 {int(percent > 50)} 1 {x2:.3f} {y2:.3f}Z" '
+                          f'fill="{MACROS[macro][2]}"/>')
+        start = end
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 32 32" width="{size}" height="{size}" '
+            f'role="img" aria-label="{label}"><g stroke="#fff" stroke-width="0.5">{"".join(slices)}</g></svg>')
+
+
+# (id, name, summary, pie SVG, shares) per split, the pies are the same for every user and diet
+_SPLIT_CHARTS = tuple(
+    (split_id, name, ", ".join(f"{percent}% {MACROS[macro][0].lower()}" for macro, percent in shares),
+     macro_pie_svg(shares), shares)
+    for split_id, name, shares in MACRO_SPLITS
+)
+
+
+@dataclass(frozen=True)
+class MacroAmount:
+    macro: str      # MACROS key, also the legend's CSS class
+    label: str
+    percent: int
+    calories: int
+    grams: int      # None for 'carbs-or-fat'
+
+
+@dataclass(frozen=True)
+class MacroSplit:
+    id: str
+    name: str
+    summary: str    # e.g. "30% protein, 25% carbs, 45% fat"
+    pie_svg: str    # inline <svg>, rendered once per split
+    macros: tuple   # MacroAmount per macro of the split
+
+
+@lru_cache(maxsize=MACRO_SPLITS_CACHE_SIZE)
+def macro_splits(calories):
+    """
+    Break a daily calorie target down into every split of MACRO_SPLITS (memoized, plans share their targets).
+
+    Parameters:
+    calories (int): Calories per day
+
+    Returns:
+    tuple: MacroSplit per MACRO_SPLITS entry
+    """
+    splits = []
+    for split_id, name, summary, pie_svg, shares in _SPLIT_CHARTS:
+        macros = []
+        for macro, percent in shares:
+            label, kcal_per_gram, _ = MACROS[macro]
+            macro_calories = calories * (percent / 100)
+            grams = round(macro_calories / kcal_per_gram) if kcal_per_gram else None
+            macros.append(MacroAmount(macro, label, percent, round(macro_calories), grams))
+        splits.append(MacroSplit(split_id, name, summary, pie_svg, tuple(macros)))
+    return tuple(splits)
+
+
+@dataclass(frozen=True)
+class ActivityTdee:
+    description: str
+    calories: str   # e.g. "2450 cal/day"
+
+
+@dataclass(frozen=True)
+class DietPlan:
+    id: str
+    name: str
+    title: str
+    description: str
+    calorie_adjustment: int
+    calories: int           # per day, TDEE + adjustment
+    macro_splits: tuple     # MacroSplit per MACRO_SPLITS entry
+
+
+@dataclass(frozen=True)
+class CaloriePlan:
+    bmr: int
+    tdee: int
+    activity_level_description: str
+    tdee_activity_levels: MappingProxyType  # activity level -> ActivityTdee, in ACTIVITY_LEVELS order
+    diets: tuple                            # DietPlan per DIET_PLANS entry
+
+
+def calorie_plan(weight_kg, height_cm, age, gender, activity_level, body_fat_percentage=None):
+    """
+    Compute (or fetch from the memo) the calorie plan for a user's measurements.
+
+    Parameters:
+    weight_kg (float): Weight in kilograms
+    height_cm (float): Height in centimeters
+    age (int): Age in years
+    gender (str): 'male' or 'female'
+    activity_level (str): One of ACTIVITY_LEVELS
+    body_fat_percentage (float): Optional, uses Katch-McArdle instead of Mifflin-St Jeor when given
+
+    Returns:
+    CaloriePlan: The frozen plan
+    """
+    if body_fat_percentage is not None:
+        # Katch-McArdle only needs weight and body fat, leaving the rest out of the key shares more plans
+        return _calorie_plan(round(weight_kg, 1), None, None, None, activity_level, round(body_fat_percentage, 1))
+    return _calorie_plan(round(weight_kg, 1), round(height_cm, 1), int(age), gender, activity_level, None)
+
+
+@lru_cache(maxsize=CALORIE_PLAN_CACHE_SIZE)
+def _calorie_plan(weight_kg, height_cm, age, gender, activity_level, body_fat_percentage):
+    if body_fat_percentage is not None:
+        bmr = calculate_bmr_katch_mcardle(weight_kg, body_fat_percentage)
+    else:
+        bmr = calculate_bmr_mifflin_st_jeor(weight_kg, height_cm, age, gender)
+
+    if activity_level not in ACTIVITY_FACTORS:
+        raise ValueError(
+            "Activity level must be one of 'sedentary', 'light', 'moderate', 'active', 'very_active'")
+    tdee = bmr * ACTIVITY_FACTORS[activity_level]
+
+    tdee_activity_levels = MappingProxyType({
+        level: ActivityTdee(description, f"{int(bmr * ACTIVITY_FACTORS[level])} cal/day")
+        for level, description in ACTIVITY_LEVELS.items()
+    })
+    diets = tuple(
+        DietPlan(diet_id, name, title, description.format(calories=int(tdee + adjustment)), adjustment,
+                 int(tdee) + adjustment, macro_splits(int(tdee) + adjustment))
+        for diet_id, name, title, description, adjustment in DIET_PLANS
+    )
+    return CaloriePlan(
+        bmr=int(bmr),
+        tdee=int(tdee),
+        activity_level_description=ACTIVITY_LEVELS[activity_level],
+        tdee_activity_levels=tdee_activity_levels,
+        diets=diets,
+    )
+
+
+def calorie_plan_cache_info():
+    """Hits, misses and size of the calorie plan memo (functools CacheInfo)."""
+    return _calorie_plan.cache_info()
+
+
+# Batch variants: every argument is a column (ndarray) with one value per user, missing values are NaN
+# and an unknown gender / activity level gives NaN instead of raising like the helpers.py functions
+_ACTIVITY_NAMES = np.array(sorted(ACTIVITY_FACTORS))
+_ACTIVITY_FACTOR_VALUES = np.array([ACTIVITY_FACTORS[level] for level in _ACTIVITY_NAMES])
+
+
+def ages_batch(birthdays, today=None):
+    """
+    Age in whole years for an array of 'YYYY-MM-DD' birthdays (None / '' -> NaN).
+
+    Returns:
+    ndarray: float ages
+    """
+    today = today or dates.today()
+    born = np.array([b or "NaT" for b in birthdays], dtype="datetime64[D]")
+    years = born.astype("datetime64[Y]").astype(np.int64) + 1970
+    months = born.astype("datetime64[M]").astype(np.int64) % 12 + 1
+    days = (born - born.astype("datetime64[M]")).astype(np.int64) + 1
+    before_birthday = (today.month * 100 + today.day) < (months * 100 + days)
+    return np.where(np.isnat(born), np.nan, today.year - years - before_birthday)
+
+
+def bmr_mifflin_st_jeor_batch(weight, height, age, gender):
+    """Mifflin-St Jeor BMR per user, see calculate_bmr_mifflin_st_jeor."""
+    offset = np.select([gender == 'male', gender == 'female'], [5.0, -161.0], np.nan)
+    return 10 * weight + 6.25 * height - 5 * age + offset
+
+
+def bmr_harris_benedict_batch(weight, height, age, gender):
+    """Revised Harris-Benedict BMR per user, see calculate_bmr_harris_benedict."""
+    male = 88.362 + (13.397 * weight) + (4.799 * height) - (5.677 * age)
+    female = 447.593 + (9.247 * weight) + (3.098 * height) - (4.330 * age)
+    return np.select([gender == 'male', gender == 'female'], [male, female], np.nan)
+
+
+def bmr_katch_mcardle_batch(weight, body_fat_percentage):
+    """Katch-McArdle BMR per user (NaN where no body fat is known), see calculate_bmr_katch_mcardle."""
+    return 370 + 21.6 * weight * (1 - body_fat_percentage / 100)
+
+
+def tdee_batch(bmr, activity_level):
+    """TDEE per user, the activity factors are found with a binary search over the sorted level names."""
+    activity_level = np.asarray(activity_level, dtype=str)
+    index = np.minimum(np.searchsorted(_ACTIVITY_NAMES, activity_level), len(_ACTIVITY_NAMES) - 1)
+    factors = np.where(_ACTIVITY_NAMES[index] == activity_level, _ACTIVITY_FACTOR_VALUES[index], np.nan)
+    return bmr * factors
+
+
+def calorie_report_batch(rows, today=None):
+    """
+    Compute the report columns for a chunk of users rows (REPORT_USERS_SQL tuples).
+
+    Returns:
+    dict: Column name -> ndarray, the BMR the app uses is Katch-McArdle if body fat is known, else Mifflin-St Jeor
+    """
+    user_ids, birthdays, genders, activity_levels, weights, heights, body_fats = zip(*rows)
+    weight = np.array(weights, dtype=np.float64)
+    height = np.array(heights, dtype=np.float64)
+    body_fat = np.array(body_fats, dtype=np.float64)  # None -> NaN
+    gender = np.array(genders, dtype=str)
+    age = ages_batch(birthdays, today)
+
+    columns = {
+        "user_id": np.array(user_ids),
+        "age": age,
+        "bmr_mifflin_st_jeor": bmr_mifflin_st_jeor_batch(weight, height, age, gender),
+        "bmr_harris_benedict": bmr_harris_benedict_batch(weight, height, age, gender),
+        "bmr_katch_mcardle": bmr_katch_mcardle_batch(weight, body_fat),
+    }
+    columns["bmr"] = np.where(np.isnan(body_fat), columns["bmr_mifflin_st_jeor"], columns["bmr_katch_mcardle"])
+    tdee = tdee_batch(columns["bmr"], activity_levels)
+    for diet_id, _, _, _, adjustment in DIET_PLANS:
+        columns[diet_id] = tdee + adjustment
+    return columns
+
+
+def iter_calorie_report(db, chunk_size=REPORT_CHUNK_SIZE, today=None):
+    """
+    Stream the cohort calorie report, one chunk of users at a time (keyset paging on users.id).
+
+    Yields:
+    dict: calorie_report_batch() columns for up to chunk_size users
+    """
+    last_id = 0
+    while True:
+        with db.connection() as conn:
+            rows = conn.execute(REPORT_USERS_SQL, (last_id, chunk_size)).fetchall()
+        if not rows:
+            return
+        yield calorie_report_batch(rows, today)
+        last_id = rows[-1][0]
+
+
+def _csv_column(values):
+    """Round a report column to whole numbers for the CSV, an unknown value (NaN) becomes empty."""
+    if values.dtype.kind != "f":
+        return values.tolist()
+    missing = np.isnan(values)
+    rounded = np.round(np.where(missing, 0, values)).astype(np.int64)
+    if not missing.any():
+        return rounded.tolist()
+    column = rounded.astype(object)
+    column[missing] = ""
+    return column.tolist()
+
+
+def write_calorie_report(db, file, chunk_size=REPORT_CHUNK_SIZE, today=None):
+    """
+    Write the cohort calorie report as CSV (whole kcal / years), holding at most one chunk of users in memory.
+
+    Parameters:
+    db (Database): The application's database
+    file (file): Text file to write to
+    chunk_size (int): Users per chunk
+
+    Returns:
+    int: Number of users in the report
+    """
+    writer = csv.writer(file)
+    users = 0
+    for columns in iter_calorie_report(db, chunk_size, today):
+        if not users:
+            writer.writerow(columns)
+        writer.writerows(zip(*(_csv_column(column) for column in columns.values())))
+        users += len(columns["user_id"])
+    return users
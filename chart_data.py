@@ -0,0 +1,165 @@
+"""
+This module prepares the weight series for the progresshub chart on the server.
+
+Multi-year daily logs are far more points than a phone can draw smoothly, so the series for the
+visible window is reduced to a point budget before it is sent:
+    1. long ranges are averaged per week or per month (whichever fits the budget first)
+    2. if that's still too many points, Largest-Triangle-Three-Buckets (LTTB) picks the points
+       that keep the visual shape of the line
+
+Everything works on NumPy arrays with dates as days since 1970-01-01.
+"""
+import numpy as np
+
+CHART_POINTS = 300          # default point budget for the chart
+MAX_CHART_POINTS = 1000
+PERIODS = ("auto", "day", "week", "month")
+
+SERIES_SQL = (
+    "SELECT date_recorded, weight_kg FROM weight_entries "
+    "WHERE user_id = ? AND date_recorded BETWEEN ? AND ? ORDER BY date_recorded"
+)
+
+
+def lttb(x, y, threshold):
+    """
+    Downsample a series with Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept. The points in between are split into
+    threshold - 2 buckets and from each bucket the point forming the largest triangle with the
+    previously selected point and the average of the next bucket is kept.
+
+    Parameters:
+    x (ndarray): Sorted x values
+    y (ndarray): y values
+    threshold (int): Number of points to keep
+
+    Returns:
+    ndarray: Indices of the selected points, ascending
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # threshold - 2 buckets over the points between the first and the last one, never empty as n > threshold
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.intp)
+    counts = np.diff(edges)
+    # Bucket averages in one go, the last point is appended as the "next bucket" of the final bucket
+    avg_x = np.append(np.add.reduceat(x[:n - 1], edges[:-1]) / counts, x[-1])
+    avg_y = np.append(np.add.reduceat(y[:n - 1], edges[:-1]) / counts, y[-1])
+
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        # Twice the triangle area for every candidate in the bucket, the constant factor doesn't matter
+        area = np.abs((x[previous] - avg_x[bucket + 1]) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (avg_y[bucket + 1] - y[previous]))
+        previous = start + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def aggregate_by_period(days, weights, period):
+    """
+    Average a daily series per calendar week (Monday to Sunday) or per calendar month.
+
+    Parameters:
+    days (ndarray): Sorted dates as days since 1970-01-01
+    weights (ndarray): Weight per date
+    period (str): 'week' or 'month'
+
+    Returns:
+    tuple: (first day of each period, mean weight per period) as ndarrays
+    """
+    if period == "week":
+        # 1970-01-01 was a Thursday, shifting by 3 days makes every week key start on a Monday
+        keys = (days + 3) // 7
+        period_starts = keys * 7 - 3
+    elif period == "month":
+        months = days.astype("datetime64[D]").astype("datetime64[M]")
+        keys = months.astype(np.int64)
+        period_starts = months.astype("datetime64[D]").astype(np.int64)
+    else:
+        raise ValueError("Period must be 'week' or 'month'")
+
+    # The series is sorted, so every period is one contiguous run of equal keys
+    run_starts = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+    counts = np.diff(np.append(run_starts, len(keys)))
+    means = np.add.reduceat(weights, run_starts) / counts
+    return period_starts[run_starts], means
+
+
+def choose_period(days, max_points):
+    """Pick the finest of day / week / month whose number of points fits the budget."""
+    if len(days) <= max_points:
+        return "day"
+    span = int(days[-1] - days[0])
+    if span // 7 + 2 <= max_points:
+        return "week"
+    return "month"
+
+
+def downsample(days, weights, max_points=CHART_POINTS, period="auto"):
+    """
+    Reduce a weight series to at most max_points points.
+
+    Parameters:
+    days (ndarray): Sorted dates as days since 1970-01-01
+    weights (ndarray): Weight per date
+    max_points (int): Point budget
+    period (str): 'day', 'week', 'month' or 'auto' to pick the finest that fits
+
+    Returns:
+    tuple: (days, weights, period actually used)
+    """
+    if len(days) == 0:
+        return days, weights, "day"
+    if period == "auto":
+        period = choose_period(days, max_points)
+    if period != "day":
+        days, weights = aggregate_by_period(days, weights, period)
+    if len(days) > max_points:
+        keep = lttb(days.astype(np.float64), weights, max_points)
+        days, weights = days[keep], weights[keep]
+    return days, weights, period
+
+
+def series_points(days, values):
+    """Chart.js points [{'x': 'YYYY-MM-DD', 'y': value rounded to 0.1}] for days since 1970-01-01."""
+    labels = np.datetime_as_string(days.astype("datetime64[D]"))
+    return [{"x": label, "y": value} for label, value in zip(labels.tolist(), np.round(values, 1).tolist())]
+
+
+def weight_chart_series(db, user_id, unit_system, start, end, max_points=CHART_POINTS, period="auto"):
+    """
+    Load a user's weights between two dates and downsample them for the chart.
+
+    Parameters:
+    db (Database): The application's database
+    user_id (int): Owner of the entries
+    unit_system (str): 'metric' or 'imperial'
+    start (str): First date (YYYY-MM-DD)
+    end (str): Last date (YYYY-MM-DD)
+    max_points (int): Point budget
+    period (str): One of PERIODS
+
+    Returns:
+    dict: 'points' as [{'x': date, 'y': weight}], 'period' used, 'total' entries in the range and 'unit'
+    """
+    with db.connection() as conn:
+        rows = conn.execute(SERIES_SQL, (user_id, start, end)).fetchall()
+
+    unit = 'lb' if unit_system == 'imperial' else 'kg'
+    if not rows:
+        return {"points": [], "period": "day", "total": 0, "unit": unit}
+
+    dates, weights_kg = zip(*rows)
+    days = np.array(dates, dtype="datetime64[D]").astype(np.int64)
+    weights = np.array(weights_kg, dtype=np.float64)
+    if unit_system == 'imperial':
+        weights = weights / 0.453592
+
+    days, weights, used_period = downsample(days, weights, max_points, period)
+    return {"points": series_points(days, weights), "period": used_period, "total": len(rows), "unit": unit}
@@ -0,0 +1,196 @@
+"""
+This module provides the data-access layer for FitHub.
+
+It replaces the CS50 Library's single module-level SQL handle with a bounded pool of raw
+sqlite3 connections. Every connection is opened in WAL mode (readers never block the writer)
+with a configurable busy timeout, and sqlite3's per-connection statement cache keeps prepared
+statements around between calls so hot queries are only compiled once per connection.
+
+Database.execute() keeps the CS50 semantics the routes were written against:
+    - statements that return rows (SELECT, PRAGMA, ... RETURNING) return a list of dicts
+    - INSERT returns the id of the new row
+    - UPDATE / DELETE return the number of affected rows
+"""
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# Defaults, can be overridden per Database instance
+DEFAULT_POOL_SIZE = 8               # max. open connections per process
+DEFAULT_BUSY_TIMEOUT_MS = 5000      # how long a writer waits for the lock before "database is locked"
+DEFAULT_ACQUIRE_TIMEOUT = 30        # seconds a thread waits for a free connection before giving up
+DEFAULT_STATEMENT_CACHE_SIZE = 128  # prepared statements kept per connection
+
+
+class PoolTimeout(RuntimeError):
+    """Raised when no pooled connection became free within the acquire timeout."""
+
+
+class Database:
+    """
+    Bounded pool of sqlite3 connections.
+
+    Connections are created lazily up to pool_size and handed out one per thread. A thread
+    that already holds a connection (e.g. inside transaction()) gets the same one back on
+    nested calls, so a route can mix db.execute() calls with an open transaction.
+
+    Parameters:
+    path (str): Path to the SQLite database file
+    pool_size (int): Maximum number of open connections
+    busy_timeout_ms (int): SQLite busy timeout in milliseconds
+    acquire_timeout (float): Seconds to wait for a free connection, None waits forever
+    statement_cache_size (int): Number of prepared statements cached per connection
+    """
+
+    def __init__(self, path, pool_size=DEFAULT_POOL_SIZE, busy_timeout_ms=DEFAULT_BUSY_TIMEOUT_MS,
+                 acquire_timeout=DEFAULT_ACQUIRE_TIMEOUT, statement_cache_size=DEFAULT_STATEMENT_CACHE_SIZE):
+        if pool_size < 1:
+            raise ValueError("pool_size must be at least 1")
+        self.path = path
+        self.pool_size = pool_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.acquire_timeout = acquire_timeout
+        self.statement_cache_size = statement_cache_size
+
+        # LIFO so the most recently used (warm) connection is handed out first
+        self._idle = queue.LifoQueue(maxsize=pool_size)
+        self._opened = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.on_query = None    # callable(sql, seconds) run after every execute(), see instrumentation.py
+
+    def _connect(self):
+        """Open and configure a new connection."""
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout_ms / 1000,
+            isolation_level=None,  # autocommit, transactions are opened explicitly
+            check_same_thread=False,  # connections move between threads via the pool
+            cached_statements=self.statement_cache_size,
+        )
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")  # safe in WAL mode, avoids an fsync per commit
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA foreign_keys = ON")  # the CS50 Library enabled this as well
+        return conn
+
+    def _checkout(self):
+        """Take an idle connection, open a new one if the pool isn't full yet, otherwise wait."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open = self._opened < self.pool_size
+            if can_open:
+                self._opened += 1
+        if can_open:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            raise PoolTimeout(
+                f"No database connection became free within {self.acquire_timeout} seconds.") from None
+
+    def _checkin(self, conn):
+        """Return a connection to the pool, rolling back anything the borrower left open."""
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection for the current thread.
+
+        Nested uses on the same thread share the connection that is already checked out.
+
+        Yields:
+        sqlite3.Connection: A pooled connection
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            yield conn
+            return
+
+        conn = self._checkout()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._checkin(conn)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run a block of statements in a single write transaction.
+
+        Commits when the block finishes and rolls back if it raises. Nested transactions join
+        the outer one.
+
+        Yields:
+        sqlite3.Connection: The connection the transaction runs on
+        """
+        with self.connection() as conn:
+            if conn.in_transaction:
+                yield conn
+                return
+
+            # IMMEDIATE takes the write lock up front so the transaction can't fail half-way with SQLITE_BUSY
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    def execute(self, sql, *args):
+        """
+        Execute a single SQL statement with positional ? placeholders.
+
+        Parameters:
+        sql (str): The SQL statement
+        *args: Values bound to the placeholders
+
+        Returns:
+        list | int: Rows as dicts, the new row id for INSERT, otherwise the affected row count
+        """
+        if self.on_query is None:
+            return self._execute(sql, args)
+        started = time.perf_counter()
+        try:
+            return self._execute(sql, args)
+        finally:
+            self.on_query(sql, time.perf_counter() - started)
+
+    def _execute(self, sql, args):
+        with self.connection() as conn:
+            cursor = conn.execute(sql, args)
+            if cursor.description is not None:
+                columns = [column[0] for column in cursor.description]
+                return [dict(zip(columns, row)) for row in cursor.fetchall()]
+            if sql.lstrip()[:6].upper() == "INSERT":
+                return cursor.lastrowid
+            return cursor.rowcount
+
+    def close(self):
+        """Close every idle connection, e.g. on shutdown or between benchmark runs."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
@@ -0,0 +1,135 @@
+"""
+This module caches rendered templates whose output is the same for every user (/home, /infohub and
+the modal partials) and sets up Jinja's bytecode cache.
+
+    - FragmentCache.render keeps the rendered HTML of a template per context, keyed by the mtimes of
+      the template and of every template it extends / includes, so editing any of them re-renders
+    - FragmentCache.page serves a whole static page: one variant per logged-in state (the navbar),
+      rendered normally while flash messages are pending since those are per request
+    - templates call {{ fragment('modals/...') }} instead of {% include %} to reuse a cached partial
+    - the bytecode cache stores compiled templates on disk, so new workers skip parsing / compiling
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from flask import render_template, session
+from jinja2 import FileSystemBytecodeCache, meta, nodes
+from markupsafe import Markup
+
+
+class FragmentCache:
+    """
+    Rendered HTML per (template, context), invalidated by template mtimes.
+
+    Parameters:
+    app (Flask): The application, its Jinja environment resolves the templates
+    max_entries (int): Max. cached fragments, least recently used ones are evicted
+    """
+
+    def __init__(self, app, max_entries=256):
+        self.app = app
+        self.max_entries = max_entries
+        self._fragments = OrderedDict()     # key -> (html, mtimes)
+        self._files = {}                    # template name -> files it is rendered from
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def _template_files(self, name):
+        """Paths of a template and of everything it extends / includes / imports / inserts with fragment()."""
+        files = self._files.get(name)
+        if files is None:
+            env = self.app.jinja_env
+            files, pending, seen = [], [name], set()
+            while pending:
+                template = pending.pop()
+                if template in seen:
+                    continue
+                seen.add(template)
+                source, filename, _ = env.loader.get_source(env, template)
+                files.append(filename)
+                ast = env.parse(source)
+                pending.extend(ref for ref in meta.find_referenced_templates(ast) if ref)
+                # Partials inserted with fragment('...') are part of the page too
+                pending.extend(call.args[0].value for call in ast.find_all(nodes.Call)
+                               if isinstance(call.node, nodes.Name) and call.node.name == "fragment"
+                               and call.args and isinstance(call.args[0], nodes.Const))
+            files = self._files[name] = tuple(files)
+        return files
+
+    def render(self, template_name, variant=(), **context):
+        """
+        Render a template (or return its cached HTML).
+
+        Parameters:
+        template_name (str): Template to render
+        variant (tuple): Extra cache key for state the template reads itself (e.g. the session)
+        context: Template variables, hashable values only
+
+        Returns:
+        str: The rendered HTML
+        """
+        key = (template_name, variant, tuple(sorted(context.items())))
+        mtimes = tuple(os.stat(path).st_mtime_ns for path in self._template_files(template_name))
+        with self._lock:
+            entry = self._fragments.get(key)
+            if entry is not None and entry[1] == mtimes:
+                self._fragments.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry[0]
+            self._stats["misses"] += 1
+            if entry is not None:
+                # A template changed, it may extend / include different templates now
+                self._files.pop(template_name, None)
+
+        html = render_template(template_name, **context)
+        mtimes = tuple(os.stat(path).st_mtime_ns for path in self._template_files(template_name))
+        with self._lock:
+            self._fragments[key] = (html, mtimes)
+            self._fragments.move_to_end(key)
+            while len(self._fragments) > self.max_entries:
+                self._fragments.popitem(last=False)
+                self._stats["evictions"] += 1
+        return html
+
+    def page(self, template_name):
+        """Render a page that only depends on whether somebody is logged in, from the cache if possible."""
+        if session.get("_flashes"):
+            return render_template(template_name)
+        return self.render(template_name, variant=(bool(session.get("user_id")),))
+
+    def fragment(self, template_name):
+        """Jinja global: a cached partial, safe to insert into the page."""
+        return Markup(self.render(template_name))
+
+    def clear(self):
+        with self._lock:
+            self._fragments.clear()
+            self._files.clear()
+
+    def stats(self):
+        """Hit / miss / eviction counters and the current size."""
+        with self._lock:
+            return dict(self._stats, size=len(self._fragments), max_entries=self.max_entries)
+
+
+def init_fragments(app, bytecode_cache=True, bytecode_cache_dir=None, max_entries=256):
+    """
+    Enable the Jinja bytecode cache and the fragment cache for an app.
+
+    Parameters:
+    app (Flask): The application
+    bytecode_cache (bool): Store compiled templates on disk
+    bytecode_cache_dir (str): Directory for them, None uses Jinja's private per-user temp directory
+    max_entries (int): Max. cached fragments
+
+    Returns:
+    FragmentCache: The cache, also available to templates as fragment()
+    """
+    if bytecode_cache:
+        if bytecode_cache_dir:
+            os.makedirs(bytecode_cache_dir, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(bytecode_cache_dir)
+    fragments = FragmentCache(app, max_entries)
+    app.jinja_env.globals["fragment"] = fragments.fragment
+    return fragments
@@ -0,0 +1,139 @@
+"""
+This module builds responsive variants of the large photos and renders them as <picture> elements.
+
+    - `flask build-images` (needs Pillow, build time only) resizes every image in RESPONSIVE_IMAGES to
+      its widths as AVIF (if Pillow supports it), WebP and JPEG into static/img/, and stores a tiny
+      blurred placeholder (a data: URI) plus the original size in static/img/manifest.json
+    - templates call {{ responsive_image('home_above_the_fold_image.jpg', 'alt text', sizes='...') }},
+      which emits the srcset / sizes sources, the dimensions (no layout shift), lazy loading and the
+      placeholder as background until the image has loaded
+    - the variants are ordinary static files, so they get content-hashed immutable URLs (see assets.py)
+    - until the images are built, the helper falls back to a plain (lazy) <img> of the original
+"""
+import base64
+import io
+import json
+import os
+
+from markupsafe import Markup, escape
+
+OUTPUT_DIRECTORY = "img"                    # below static/
+MANIFEST_FILE = "img/manifest.json"
+FORMATS = ("avif", "webp", "jpeg")          # <source> order, the JPEGs are the <img> fallback
+MIMETYPES = {"avif": "image/avif", "webp": "image/webp", "jpeg": "image/jpeg"}
+QUALITY = {"avif": 50, "webp": 75, "jpeg": 80}
+PLACEHOLDER_WIDTH = 24                      # px, blurred and inlined as a data: URI
+
+# Source image (below static/) -> widths in px to generate, never wider than the original
+RESPONSIVE_IMAGES = {
+    "home_above_the_fold_image.jpg": (320, 480, 768, 1200),
+}
+
+
+def build_images(static_folder, log=print):
+    """
+    Generate the variants and placeholders of RESPONSIVE_IMAGES and write the manifest.
+
+    Parameters:
+    static_folder (str): The app's static folder
+
+    Returns:
+    dict: The manifest, source image -> width, height, placeholder and {format: [[width, file]]}
+    """
+    try:
+        from PIL import Image, ImageFilter, features
+    except ImportError as error:
+        raise RuntimeError("Building the image variants needs Pillow: pip install Pillow") from error
+
+    formats = [fmt for fmt in FORMATS if fmt != "avif" or features.check("avif")]
+    if "avif" not in formats:
+        log("Pillow has no AVIF support here, only WebP and JPEG variants are built")
+    os.makedirs(os.path.join(static_folder, OUTPUT_DIRECTORY), exist_ok=True)
+
+    manifest = {}
+    for source, widths in RESPONSIVE_IMAGES.items():
+        with Image.open(os.path.join(static_folder, source)) as original:
+            image = original.convert("RGB")
+        stem = os.path.splitext(os.path.basename(source))[0]
+        entry = {"width": image.width, "height": image.height, "variants": {fmt: [] for fmt in formats}}
+
+        for width in sorted({min(width, image.width) for width in widths}):
+            resized = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+            for fmt in formats:
+                filename = f"{OUTPUT_DIRECTORY}/{stem}-{width}.{fmt}"
+                resized.save(os.path.join(static_folder, *filename.split("/")), fmt.upper(), quality=QUALITY[fmt])
+                entry["variants"][fmt].append([width, filename])
+
+        placeholder = image.resize((PLACEHOLDER_WIDTH, max(1, round(image.height * PLACEHOLDER_WIDTH / image.width))))
+        buffer = io.BytesIO()
+        placeholder.filter(ImageFilter.GaussianBlur(1)).save(buffer, "JPEG", quality=40)
+        entry["placeholder"] = "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+        manifest[source] = entry
+        log(f"{source}: {image.width}x{image.height} -> {len(entry['variants']['jpeg'])} widths x {', '.join(formats)}")
+
+    with open(os.path.join(static_folder, *MANIFEST_FILE.split("/")), "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=1)
+    return manifest
+
+
+class ResponsiveImages:
+    """
+    Renders <picture> elements from the image manifest.
+
+    Parameters:
+    static_folder (str): The app's static folder
+    asset_url (callable): File below static/ -> URL (AssetManifest.url)
+    """
+
+    def __init__(self, static_folder, asset_url):
+        self.asset_url = asset_url
+        try:
+            with open(os.path.join(static_folder, *MANIFEST_FILE.split("/")), encoding="utf-8") as file:
+                self.manifest = json.load(file)
+        except FileNotFoundError:
+            self.manifest = {}
+
+    def srcset(self, variants):
+        return ", ".join(f"{escape(self.asset_url(filename))} {width}w" for width, filename in variants)
+
+    def render(self, source, alt, sizes="100vw", css_class="", priority=False):
+        """
+        Jinja global responsive_image: a <picture> with AVIF / WebP / JPEG candidates for an image.
+
+        Parameters:
+        source (str): Image below static/ (a key of RESPONSIVE_IMAGES)
+        alt (str): Alternative text
+        sizes (str): The sizes attribute, the rendered width of the image per viewport
+        css_class (str): Classes of the <img>
+        priority (bool): Above-the-fold image: load eagerly with high priority instead of lazily
+        """
+        loading = 'loading="eager" fetchpriority="high"' if priority else 'loading="lazy"'
+        entry = self.manifest.get(source)
+        if entry is None:
+            return Markup(f'<img src="{escape(self.asset_url(source))}" alt="{escape(alt)}" '
+                          f'class="{escape(css_class)}" {loading} decoding="async">')
+
+        variants = entry["variants"]
+        sources = [f'<source type="{MIMETYPES[fmt]}" srcset="{self.srcset(variants[fmt])}" sizes="{escape(sizes)}">'
+                   for fmt in FORMATS if fmt != "jpeg" and variants.get(fmt)]
+        fallback = variants["jpeg"][len(variants["jpeg"]) // 2][1]
+        # The blurred placeholder shows until the image has loaded, then it's removed (the hero is semi-transparent)
+        image = (f'<img src="{escape(self.asset_url(fallback))}" srcset="{self.srcset(variants["jpeg"])}" '
+                 f'sizes="{escape(sizes)}" width="{entry["width"]}" height="{entry["height"]}" alt="{escape(alt)}" '
+                 f'class="{escape(css_class)}" {loading} decoding="async" '
+                 f'style="background: url({entry["placeholder"]}) center / cover no-repeat" '
+                 f'onload="this.style.background = \'none\'">')
+        return Markup("<picture>" + "".join(sources) + image + "</picture>")
+
+
+def init_images(app, assets):
+    """
+    Register the responsive_image() template helper.
+
+    Returns:
+    ResponsiveImages: The renderer
+    """
+    images = ResponsiveImages(app.static_folder, assets.url)
+    app.jinja_env.globals["responsive_image"] = images.render
+    return images
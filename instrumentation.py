@@ -0,0 +1,253 @@
+"""
+This module times where requests spend their time and exposes it in the Prometheus text format.
+
+    - wall time per endpoint / method / status as a histogram (measured up to the end of the view and
+      the after_request hooks, the body of a streamed response is not included)
+    - every Database.execute() call, grouped by SQL fingerprint (literals and IN lists collapsed)
+    - every template render (Flask's render signals, nested partials are counted inside their page too)
+    - every password KDF call, waiting for a worker and hashing separately
+    - the counters of the caches (kdf pool, profiles, fragments) are added as gauges when scraped
+A request slower than the slow-request threshold is logged with its breakdown: queries, templates and KDF.
+"""
+import re
+import threading
+import time
+from functools import lru_cache
+
+from flask import before_render_template, g, has_app_context, request, template_rendered
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)   # seconds
+DEFAULT_SLOW_REQUEST_MS = 500
+SLOW_REQUEST_TOP_QUERIES = 3    # slowest query fingerprints named in the slow-request log
+
+_WHITESPACE = re.compile(r"\s+")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|(?<![\w.])-?\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)+\s*\)", re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def sql_fingerprint(sql):
+    """
+    Normalize a statement so every call of the same query shares one metric.
+
+    Parameters:
+    sql (str): The SQL as passed to execute()
+
+    Returns:
+    str: One line, literals replaced by ? and IN (?, ?, ...) lists by IN (...)
+    """
+    sql = _LITERALS.sub("?", _WHITESPACE.sub(" ", sql.strip()))
+    return _IN_LISTS.sub("IN (...)", sql)
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class RequestTimings:
+    """What one request spent its time on, kept in flask.g while it runs."""
+
+    __slots__ = ("started", "queries", "query_seconds", "by_fingerprint", "template_seconds", "templates",
+                 "render_stack", "kdf_seconds")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.by_fingerprint = {}    # fingerprint -> seconds
+        self.template_seconds = 0.0  # top-level renders only, partials are part of their page
+        self.templates = []
+        self.render_stack = []
+        self.kdf_seconds = 0.0
+
+
+class Instrumentation:
+    """
+    Thread-safe aggregates of the request, query, template and KDF timings.
+
+    Parameters:
+    slow_request_ms (float): Requests taking longer are logged with their breakdown, 0 turns the log off
+    logger (logging.Logger): Where slow requests are logged
+    """
+
+    def __init__(self, slow_request_ms=DEFAULT_SLOW_REQUEST_MS, logger=None):
+        self.slow_request_ms = slow_request_ms
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._requests = {}     # (endpoint, method, status) -> [count, seconds, bucket counts]
+        self._queries = {}      # fingerprint -> [count, seconds, max seconds]
+        self._templates = {}    # template -> [count, seconds]
+        self._kdf = {}          # operation -> [count, wait seconds, hash seconds]
+        self._collectors = []   # (name, callable returning a dict of numbers)
+
+    def add_collector(self, name, stats):
+        """Export the numeric values of stats() as gauges fithub_<name>_<key> on every scrape."""
+        self._collectors.append((name, stats))
+
+    # Hooks ------------------------------------------------------------------------------------------
+
+    def _current(self):
+        return g.get("_timings") if has_app_context() else None
+
+    def record_query(self, sql, seconds):
+        fingerprint = sql_fingerprint(sql)
+        with self._lock:
+            entry = self._queries.get(fingerprint)
+            if entry is None:
+                entry = self._queries[fingerprint] = [0, 0.0, 0.0]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+        timings = self._current()
+        if timings is not None:
+            timings.queries += 1
+            timings.query_seconds += seconds
+            timings.by_fingerprint[fingerprint] = timings.by_fingerprint.get(fingerprint, 0.0) + seconds
+
+    def record_kdf(self, operation, wait_seconds, hash_seconds):
+        with self._lock:
+            entry = self._kdf.setdefault(operation, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += wait_seconds
+            entry[2] += hash_seconds
+        timings = self._current()
+        if timings is not None:
+            timings.kdf_seconds += wait_seconds + hash_seconds
+
+    def _render_started(self, sender, template, context, **extra):
+        timings = self._current()
+        if timings is not None:
+            timings.render_stack.append(time.perf_counter())
+
+    def _render_finished(self, sender, template, context, **extra):
+        timings = self._current()
+        if timings is None or not timings.render_stack:
+            return
+        seconds = time.perf_counter() - timings.render_stack.pop()
+        with self._lock:
+            entry = self._templates.setdefault(template.name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+        if not timings.render_stack:
+            timings.template_seconds += seconds
+            timings.templates.append(template.name)
+
+    def _request_started(self):
+        g._timings = RequestTimings()
+
+    def _request_finished(self, response):
+        timings = g.pop("_timings", None)
+        if timings is None:
+            return response
+        seconds = time.perf_counter() - timings.started
+        key = (request.endpoint or "unmatched", request.method, response.status_code)
+        with self._lock:
+            entry = self._requests.get(key)
+            if entry is None:
+                entry = self._requests[key] = [0, 0.0, [0] * len(REQUEST_BUCKETS)]
+            entry[0] += 1
+            entry[1] += seconds
+            for i, bound in enumerate(REQUEST_BUCKETS):
+                if seconds <= bound:
+                    entry[2][i] += 1
+        if self.slow_request_ms and seconds * 1000 >= self.slow_request_ms and self.logger is not None:
+            self._log_slow_request(key, seconds, timings)
+        return response
+
+    def _log_slow_request(self, key, seconds, timings):
+        slowest = sorted(timings.by_fingerprint.items(), key=lambda item: item[1], reverse=True)
+        self.logger.warning(
+            "Slow request %s %s -> %s: %.0f ms (db %d queries %.0f ms, templates %s %.0f ms, kdf %.0f ms, "
+            "other %.0f ms); slowest queries: %s",
+            key[1], request.full_path.rstrip("?"), key[2], seconds * 1000,
+            timings.queries, timings.query_seconds * 1000, "+".join(timings.templates) or "-",
+            timings.template_seconds * 1000, timings.kdf_seconds * 1000,
+            (seconds - timings.query_seconds - timings.template_seconds - timings.kdf_seconds) * 1000,
+            "; ".join(f"{spent * 1000:.1f} ms {fingerprint}" for fingerprint, spent in slowest[:SLOW_REQUEST_TOP_QUERIES])
+            or "-",
+        )
+
+    # Exposition -------------------------------------------------------------------------------------
+
+    def render(self):
+        """
+        All metrics in the Prometheus text exposition format.
+
+        Returns:
+        str: The scrape body
+        """
+        with self._lock:
+            requests = {key: (count, seconds, list(buckets)) for key, (count, seconds, buckets) in self._requests.items()}
+            queries = {key: tuple(entry) for key, entry in self._queries.items()}
+            templates = {key: tuple(entry) for key, entry in self._templates.items()}
+            kdf = {key: tuple(entry) for key, entry in self._kdf.items()}
+
+        lines = [
+            "# HELP fithub_request_duration_seconds Wall time per request until the response is returned.",
+            "# TYPE fithub_request_duration_seconds histogram",
+        ]
+        for (endpoint, method, status), (count, seconds, buckets) in sorted(requests.items()):
+            labels = f'endpoint="{_label(endpoint)}",method="{method}",status="{status}"'
+            for bound, bucket in zip(REQUEST_BUCKETS, buckets):
+                lines.append(f'fithub_request_duration_seconds_bucket{{{labels},le="{bound}"}} {bucket}')
+            lines.append(f'fithub_request_duration_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"fithub_request_duration_seconds_sum{{{labels}}} {seconds:.6f}")
+            lines.append(f"fithub_request_duration_seconds_count{{{labels}}} {count}")
+
+        def counters(name, help_text, kind, rows):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in rows:
+                lines.append(f"{name}{{{labels}}} {value}")
+
+        query_labels = {fingerprint: f'query="{_label(fingerprint)}"' for fingerprint in queries}
+        counters("fithub_db_queries_total", "Database.execute() calls per SQL fingerprint.", "counter",
+                 [(query_labels[key], count) for key, (count, _, _) in sorted(queries.items())])
+        counters("fithub_db_query_seconds_total", "Time spent in Database.execute() per SQL fingerprint.", "counter",
+                 [(query_labels[key], f"{seconds:.6f}") for key, (_, seconds, _) in sorted(queries.items())])
+        counters("fithub_db_query_max_seconds", "Slowest Database.execute() call per SQL fingerprint.", "gauge",
+                 [(query_labels[key], f"{slowest:.6f}") for key, (_, _, slowest) in sorted(queries.items())])
+        counters("fithub_template_renders_total", "Template renders (cached fragments aren't rendered).", "counter",
+                 [(f'template="{_label(key)}"', count) for key, (count, _) in sorted(templates.items())])
+        counters("fithub_template_render_seconds_total", "Time spent rendering templates, incl. nested ones.", "counter",
+                 [(f'template="{_label(key)}"', f"{seconds:.6f}") for key, (_, seconds) in sorted(templates.items())])
+        counters("fithub_kdf_operations_total", "Password KDF calls.", "counter",
+                 [(f'operation="{key}"', count) for key, (count, _, _) in sorted(kdf.items())])
+        counters("fithub_kdf_wait_seconds_total", "Time password KDF calls waited for a worker.", "counter",
+                 [(f'operation="{key}"', f"{wait:.6f}") for key, (_, wait, _) in sorted(kdf.items())])
+        counters("fithub_kdf_hash_seconds_total", "Time spent in the password KDF.", "counter",
+                 [(f'operation="{key}"', f"{seconds:.6f}") for key, (_, _, seconds) in sorted(kdf.items())])
+
+        for name, stats in self._collectors:
+            for key, value in stats().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"# TYPE fithub_{name}_{key} gauge")
+                    lines.append(f"fithub_{name}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def init_instrumentation(app, db, passwords, slow_request_ms=DEFAULT_SLOW_REQUEST_MS):
+    """
+    Time the requests of an app, its database queries, template renders and password KDF calls.
+
+    Register it before the app's own after_request hooks, so the recorded status is the final one
+    (e.g. a 304 from the cache policy).
+
+    Parameters:
+    app (Flask): The application
+    db (Database): Its database, every execute() is timed
+    passwords (PasswordHasher): Its password hasher, every hash / verify is timed
+    slow_request_ms (float): Log requests slower than this with their breakdown, 0 turns the log off
+
+    Returns:
+    Instrumentation: The aggregates, render() gives the Prometheus text
+    """
+    instrumentation = Instrumentation(slow_request_ms, app.logger)
+    db.on_query = instrumentation.record_query
+    passwords.on_complete = instrumentation.record_kdf
+    before_render_template.connect(instrumentation._render_started, app, weak=False)
+    template_rendered.connect(instrumentation._render_finished, app, weak=False)
+    app.before_request(instrumentation._request_started)
+    app.after_request(instrumentation._request_finished)
+    return instrumentation
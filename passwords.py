@@ -0,0 +1,134 @@
+"""
+This module runs password hashing and verification in a bounded worker process pool.
+
+The password KDF (scrypt by default) is deliberately expensive. Running it inline means a burst of
+logins occupies every request thread and cheap pages like /home have to wait behind it. Instead the
+hashing runs in a fixed number of worker processes:
+    - at most `workers` hashes run at once, up to `max_queue` more wait for a free worker
+    - a request that can't get a slot within `queue_timeout` seconds fails fast with KDFBusy,
+      which the app answers with a 503
+    - queue depth, wait time and hashing time are recorded for the metrics endpoint
+"""
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_HASH_METHOD = "scrypt:32768:8:1"  # werkzeug's default work factor (N=2^15, r=8, p=1)
+
+
+class KDFBusy(RuntimeError):
+    """Raised when every KDF worker and queue slot stays taken for longer than the queue timeout."""
+
+
+def _warm_up():
+    """Runs in each worker once so all processes are forked up front."""
+    time.sleep(0.05)
+
+
+class PasswordHasher:
+    """
+    Bounded pool of KDF worker processes.
+
+    Parameters:
+    workers (int): Worker processes, 0 hashes inline in the request thread (no pool)
+    max_queue (int): Requests allowed to wait for a worker on top of the running ones
+    queue_timeout (float): Seconds a request waits for a slot before KDFBusy
+    method (str): werkzeug hash method incl. work factor, e.g. 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000'
+    """
+
+    def __init__(self, workers=2, max_queue=16, queue_timeout=2.0, method=DEFAULT_HASH_METHOD):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.method = method
+
+        self._slots = threading.BoundedSemaphore(max(workers, 1) + max_queue)
+        self._lock = threading.Lock()
+        self._stats = {
+            "depth": 0,            # requests running or waiting right now
+            "peak_depth": 0,
+            "completed": 0,
+            "rejected": 0,
+            "wait_seconds": 0.0,   # total time spent waiting for a worker
+            "hash_seconds": 0.0,   # total time spent hashing (incl. process round trip)
+            "max_seconds": 0.0,    # slowest wait + hash
+        }
+
+        self.on_complete = None     # callable(operation, wait_seconds, hash_seconds), see instrumentation.py
+
+        self._executor = None
+        if workers:
+            # Fork the workers now, while the app is still single-threaded, instead of lazily mid-request
+            self._executor = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("fork"))
+            for future in [self._executor.submit(_warm_up) for _ in range(workers)]:
+                future.result()
+
+    def _run(self, operation, function, *args):
+        """Run a KDF call in the pool, waiting at most queue_timeout for a slot."""
+        queued = time.perf_counter()
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise KDFBusy("All password hashing workers are busy.")
+
+        with self._lock:
+            self._stats["depth"] += 1
+            self._stats["peak_depth"] = max(self._stats["peak_depth"], self._stats["depth"])
+        try:
+            started = time.perf_counter()
+            if self._executor is None:
+                result = function(*args)
+            else:
+                result = self._executor.submit(function, *args).result()
+            finished = time.perf_counter()
+        finally:
+            with self._lock:
+                self._stats["depth"] -= 1
+            self._slots.release()
+
+        with self._lock:
+            self._stats["completed"] += 1
+            self._stats["wait_seconds"] += started - queued
+            self._stats["hash_seconds"] += finished - started
+            self._stats["max_seconds"] = max(self._stats["max_seconds"], finished - queued)
+        if self.on_complete is not None:
+            self.on_complete(operation, started - queued, finished - started)
+        return result
+
+    def hash(self, password):
+        """Return a salted hash of the password with the configured method."""
+        return self._run("hash", generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        """Check a password against a stored hash (the hash carries its own method and work factor)."""
+        return self._run("verify", check_password_hash, pwhash, password)
+
+    def metrics(self):
+        """
+        Snapshot of the KDF statistics.
+
+        Returns:
+        dict: Current / peak queue depth, completed and rejected counts, average wait and hash time
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        completed = stats["completed"] or 1
+        return {
+            "workers": self.workers,
+            "queue_capacity": self.max_queue,
+            "queue_depth": stats["depth"],
+            "peak_queue_depth": stats["peak_depth"],
+            "completed": stats["completed"],
+            "rejected": stats["rejected"],
+            "avg_wait_ms": round(stats["wait_seconds"] / completed * 1000, 2),
+            "avg_hash_ms": round(stats["hash_seconds"] / completed * 1000, 2),
+            "max_latency_ms": round(stats["max_seconds"] * 1000, 2),
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,123 @@
+"""
+This module caches each user's profile for the hub routes.
+
+Nearly every logged-in page needs the user's unit system, weight, height, age, ... but the row only
+changes when the settings form is posted. ProfileCache keeps the row together with the values
+derived from it (age, weight in lb, height in ft / in) in a bounded LRU:
+    - entries expire after `ttl` seconds and at midnight (the age depends on today's date)
+    - settings() invalidates the user's entry right after writing, so this process never serves old data
+    - with several worker processes another worker's write shows up after at most `ttl` seconds, so
+      the routes that store weights in the user's units ask for a fresh row (get(..., fresh=True))
+      and a unit_system change can never make them store lb as kg
+
+The password hash is deliberately not part of the profile, change_password() reads it itself.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from dates import calculate_age, today
+
+PROFILE_CACHE_SIZE = 1024   # profiles kept before the least recently used are evicted
+# Seconds a profile is served from the cache. The cache is per process: invalidate() only reaches the
+# worker that handled the settings form, the others can show the old profile for up to PROFILE_TTL
+# (pages only, the write paths read the row fresh)
+PROFILE_TTL = 300
+
+PROFILE_SQL = (
+    "SELECT id, username, unit_system, current_weight_kg, height_cm, birthday, gender, activity_level, "
+    "body_fat_percentage FROM users WHERE id = ?"
+)
+
+
+def build_profile(user):
+    """
+    Add the derived fields to a users row.
+
+    Returns:
+    dict: The row plus 'age', 'weight_lb', 'height_ft' and 'height_in'
+    """
+    profile = dict(user)
+    profile['age'] = calculate_age(user['birthday'])
+    profile['weight_lb'] = round(user['current_weight_kg'] / 0.453592, 1)
+    total_height_in_inches = round(user['height_cm'] / 2.54)
+    profile['height_ft'] = int(total_height_in_inches // 12)
+    profile['height_in'] = int(total_height_in_inches % 12)
+    return profile
+
+
+class ProfileCache:
+    """
+    Bounded LRU of user profiles with TTL.
+
+    Parameters:
+    db (Database): The application's database
+    max_entries (int): Profiles kept at most
+    ttl (float): Seconds a profile is served from the cache
+    """
+
+    def __init__(self, db, max_entries=PROFILE_CACHE_SIZE, ttl=PROFILE_TTL):
+        self.db = db
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+        self._generation = 0  # bumped by invalidate(), a profile read before that is not stored
+
+    def get(self, user_id, fresh=False):
+        """
+        Return the profile of a user.
+
+        Parameters:
+        user_id (int): The user
+        fresh (bool): Read the row from the database even if it's cached (and refresh the cache with it),
+            for requests that convert and store values in the user's units
+
+        Returns:
+        dict: A copy of the profile (routes may add keys to it), None if the user doesn't exist
+        """
+        now, day = time.monotonic(), today()
+        with self._lock:
+            entry = self._profiles.get(user_id)
+            if not fresh and entry is not None and entry[1] > now and entry[2] == day:
+                self._profiles.move_to_end(user_id)
+                self._stats["hits"] += 1
+                return dict(entry[0])
+            self._stats["misses"] += 1
+            generation = self._generation
+
+        rows = self.db.execute(PROFILE_SQL, user_id)
+        if not rows:
+            return None
+        profile = build_profile(rows[0])
+
+        with self._lock:
+            if generation != self._generation:
+                return dict(profile)
+            self._profiles[user_id] = (profile, now + self.ttl, day)
+            self._profiles.move_to_end(user_id)
+            while len(self._profiles) > self.max_entries:
+                self._profiles.popitem(last=False)
+                self._stats["evictions"] += 1
+        return dict(profile)
+
+    def invalidate(self, user_id):
+        """Drop a user's profile, call it after writing to their users row."""
+        with self._lock:
+            self._generation += 1
+            if self._profiles.pop(user_id, None) is not None:
+                self._stats["invalidations"] += 1
+
+    def stats(self):
+        """
+        Snapshot of the cache counters.
+
+        Returns:
+        dict: Hits, misses, evictions, invalidations, hit rate and current size
+        """
+        with self._lock:
+            stats = dict(self._stats, size=len(self._profiles))
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else None
+        return stats
@@ -0,0 +1,159 @@
+"""
+This module profiles single requests on demand, for finding out why a page is slow for one user.
+
+A request is profiled with cProfile when
+    - it carries the header X-FitHub-Profile: <token> (the configured FITHUB_PROFILE_TOKEN), or
+    - it is picked at random by the sample rate, optionally only for some path prefixes
+Each profiled request writes two files into the profile directory:
+    - <name>.prof: pstats dump (python -m pstats, snakeviz, ...)
+    - <name>.folded: collapsed stacks, one "frame;frame;frame microseconds" line per stack, for
+      flamegraph.pl or speedscope; derived from cProfile's caller / callee times, so a function
+      called from several places shares its children proportionally
+The body of a streamed response (the exports) is produced after the profiled call and isn't included.
+The profiler wraps the WSGI app and is only installed if a token or a sample rate is configured,
+so it costs nothing when off and a single header lookup per request when on.
+"""
+import cProfile
+import hmac
+import os
+import pstats
+import random
+import re
+import time
+from collections import Counter
+
+PROFILE_HEADER = "HTTP_X_FITHUB_PROFILE"   # X-FitHub-Profile in the WSGI environ
+DEFAULT_KEEP = 100                          # profiled requests kept in the directory, oldest are removed
+MIN_STACK_SECONDS = 1e-5                    # subtrees below this are left out of the collapsed stacks
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+def _frame_label(func):
+    filename, lineno, name = func
+    if filename == "~":
+        return name.replace(";", ",")   # built-in, e.g. <method 'execute' of 'sqlite3.Connection' objects>
+    return f"{name} ({os.path.basename(filename)}:{lineno})".replace(";", ",")
+
+
+def collapsed_stacks(stats):
+    """
+    Turn cProfile statistics into collapsed stacks.
+
+    Parameters:
+    stats (pstats.Stats): Statistics of one profiled run
+
+    Returns:
+    Counter: "frame;frame;..." -> self time in microseconds
+    """
+    callees = {}
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, {})[func] = edge
+
+    stacks = Counter()
+    pending = [((func,), tt, ct) for func, (_, _, tt, ct, callers) in stats.stats.items() if not callers]
+    while pending:
+        path, self_seconds, cumulative = pending.pop()
+        func = path[-1]
+        stacks[";".join(_frame_label(frame) for frame in path)] += round(self_seconds * 1e6)
+        # A function reached on this path only gets its share of its callees' time
+        total = stats.stats[func][3]
+        share = cumulative / total if total else 0.0
+        for callee, (_, _, tt, ct) in callees.get(func, {}).items():
+            if callee not in path and ct * share >= MIN_STACK_SECONDS:
+                pending.append((path + (callee,), tt * share, ct * share))
+    return +stacks
+
+
+class RequestProfiler:
+    """
+    WSGI middleware that runs selected requests under cProfile.
+
+    Parameters:
+    wsgi_app (callable): The wrapped WSGI application
+    directory (str): Where the .prof / .folded files go
+    token (str): Requests whose X-FitHub-Profile header equals it are profiled, None turns the header off
+    sample_rate (float): Share of the other requests to profile, 0 turns sampling off
+    paths (tuple): Path prefixes sampling is limited to, empty = every path
+    keep (int): Profiled requests kept in the directory
+    logger (logging.Logger): Logs every written profile
+    """
+
+    def __init__(self, wsgi_app, directory, token=None, sample_rate=0.0, paths=(), keep=DEFAULT_KEEP, logger=None):
+        self.wsgi_app = wsgi_app
+        self.directory = directory
+        self.token = token.encode() if token else None
+        self.sample_rate = sample_rate
+        self.paths = tuple(paths)
+        self.keep = keep
+        self.logger = logger
+        os.makedirs(directory, exist_ok=True)
+
+    def _wanted(self, environ):
+        header = environ.get(PROFILE_HEADER)
+        if header is not None and self.token is not None:
+            return hmac.compare_digest(header.encode(), self.token)
+        return (self.sample_rate > 0 and environ.get("PATH_INFO", "").startswith(self.paths or ("",))
+                and random.random() < self.sample_rate)
+
+    def __call__(self, environ, start_response):
+        if not self._wanted(environ):
+            return self.wsgi_app(environ, start_response)
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is active (Python 3.12+ allows only one at a time), run this request normally
+            return self.wsgi_app(environ, start_response)
+        started = time.perf_counter()
+        try:
+            return self.wsgi_app(environ, start_response)
+        finally:
+            profiler.disable()
+            self._write(profiler, environ, time.perf_counter() - started)
+
+    def _write(self, profiler, environ, seconds):
+        """Dump the pstats and collapsed stacks of a profiled request and prune old profiles."""
+        path = environ.get("PATH_INFO", "/")
+        name = (f"{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 10**9:09d}-{environ.get('REQUEST_METHOD', 'GET')}"
+                f"-{_UNSAFE.sub('_', path.strip('/')) or 'root'}-{seconds * 1000:.0f}ms")
+        base = os.path.join(self.directory, name)
+        stats = pstats.Stats(profiler)
+        stats.dump_stats(base + ".prof")
+        with open(base + ".folded", "w", encoding="utf-8") as file:
+            for stack, microseconds in sorted(collapsed_stacks(stats).items()):
+                file.write(f"{stack} {microseconds}\n")
+        if self.logger is not None:
+            self.logger.info("Profiled %s %s (%.0f ms): %s.prof / .folded", environ.get("REQUEST_METHOD"), path,
+                             seconds * 1000, base)
+
+        profiles = sorted(entry for entry in os.listdir(self.directory) if entry.endswith(".prof"))
+        for stale in profiles[:max(len(profiles) - self.keep, 0)]:
+            for extension in (".prof", ".folded"):
+                try:
+                    os.remove(os.path.join(self.directory, stale[:-len(".prof")] + extension))
+                except FileNotFoundError:
+                    pass
+
+
+def init_profiler(app, directory="profiles", token=None, sample_rate=0.0, paths=(), keep=DEFAULT_KEEP):
+    """
+    Wrap an app's WSGI callable with the request profiler, if a token or a sample rate is set.
+
+    Parameters:
+    app (Flask): The application
+    directory (str): Where profiles are written
+    token (str): Secret for the X-FitHub-Profile header
+    sample_rate (float): Share of requests to profile at random, e.g. 0.001
+    paths (tuple): Path prefixes sampling is limited to, e.g. ('/progresshub', '/caloriehub_plans')
+    keep (int): Profiled requests kept
+
+    Returns:
+    RequestProfiler: The middleware, None if profiling is off
+    """
+    if not token and sample_rate <= 0:
+        return None
+    app.wsgi_app = RequestProfiler(app.wsgi_app, directory, token, sample_rate, paths, keep, app.logger)
+    return app.wsgi_app
@@ -0,0 +1,350 @@
+"""
+This module provides bulk import, streaming export and paged reads of weight entries for the progresshub.
+
+Uploads are read row by row (CSV and JSON Lines are streamed, a JSON array is parsed in one go),
+every row is checked with the same rules as a single progresshub entry and valid rows are written
+in chunked transactions with executemany, so importing years of scale data takes seconds.
+
+Exports walk a single sqlite3 cursor and convert one row at a time, so memory use stays flat
+no matter how long a user's history is. Pages use keyset pagination on (date_recorded, id), so
+fetching any page costs one index range search, however far back it is.
+"""
+import csv
+import io
+import itertools
+import json
+
+from dates import parse_iso_date
+from validation import WEIGHT_ENTRY_SCHEMA
+
+IMPORT_FORMATS = ("csv", "json")
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+EXPORT_BATCH_SIZE = 500     # rows joined into one chunk of the streamed response
+PAGE_SIZE = 120             # entries per page of the progresshub chart / table
+MAX_PAGE_SIZE = 1000
+
+# Open-ended ranges are bound to these so both page queries stay constant, index-backed statements
+MIN_DATE = "0000-01-01"
+MAX_DATE = "9999-12-31"
+MAX_ID = 2 ** 63 - 1
+
+# Entries after a cursor, oldest first
+ENTRIES_AFTER_SQL = (
+    "SELECT id, weight_kg, date_recorded FROM weight_entries "
+    "WHERE user_id = ? AND date_recorded BETWEEN ? AND ? AND (date_recorded, id) > (?, ?) "
+    "ORDER BY date_recorded, id LIMIT ?"
+)
+# Entries before a cursor, newest first (reversed before they are returned)
+ENTRIES_BEFORE_SQL = (
+    "SELECT id, weight_kg, date_recorded FROM weight_entries "
+    "WHERE user_id = ? AND date_recorded BETWEEN ? AND ? AND (date_recorded, id) < (?, ?) "
+    "ORDER BY date_recorded DESC, id DESC LIMIT ?"
+)
+IMPORT_CHUNK_SIZE = 5000    # rows per transaction, keeps the write lock short for other requests
+MAX_REPORTED_ERRORS = 100   # rejected rows listed individually in the report, the rest are only counted
+
+# Same upsert as a single progresshub entry: a later row for the same date overwrites the weight
+UPSERT_WEIGHT_ENTRY_SQL = (
+    "INSERT INTO weight_entries (user_id, weight_kg, date_recorded) VALUES (?, ?, ?) "
+    "ON CONFLICT(user_id, date_recorded) DO UPDATE SET weight_kg = excluded.weight_kg, updated_at = CURRENT_TIMESTAMP"
+)
+
+DATE_COLUMNS = ("date", "date_recorded")
+WEIGHT_COLUMNS = ("weight",)  # always in the user's unit system
+
+
+def detect_import_format(filename, requested=None):
+    """
+    Work out whether an upload is CSV or JSON.
+
+    Parameters:
+    filename (str): Name of the uploaded file
+    requested (str): Format picked explicitly by the client, takes precedence
+
+    Returns:
+    str: 'csv' or 'json', None if it can't be determined
+    """
+    if requested:
+        requested = requested.lower()
+        return requested if requested in IMPORT_FORMATS else None
+    extension = (filename or "").rsplit(".", 1)[-1].lower()
+    if extension == "csv":
+        return "csv"
+    if extension in ("json", "jsonl", "ndjson"):
+        return "json"
+    return None
+
+
+def _pick(mapping, keys):
+    """Return the first value in mapping found under one of keys."""
+    for key in keys:
+        if key in mapping:
+            return mapping[key]
+    return None
+
+
+def _loads_or_none(line):
+    """Decode one JSON Lines value, a malformed line becomes None and is rejected by validation."""
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+def iter_csv_rows(stream):
+    """
+    Yield (row_number, date, weight) from a CSV byte stream.
+
+    A header row naming a date and a weight column is optional, without one the first two
+    columns are read as date, weight.
+    """
+    reader = csv.reader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+    date_index, weight_index = 0, 1
+    first_row = True
+
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        if first_row:
+            first_row = False
+            header = [cell.strip().lower() for cell in row]
+            date_column = next((column for column in DATE_COLUMNS if column in header), None)
+            weight_column = next((column for column in WEIGHT_COLUMNS if column in header), None)
+            if date_column and weight_column:
+                date_index, weight_index = header.index(date_column), header.index(weight_column)
+                continue
+
+        date_recorded = row[date_index].strip() if len(row) > date_index else ""
+        weight = row[weight_index].strip() if len(row) > weight_index else ""
+        yield reader.line_num, date_recorded, weight
+
+
+def iter_json_rows(stream):
+    """
+    Yield (row_number, date, weight) from a JSON byte stream.
+
+    Accepts a JSON array or JSON Lines (one value per line, streamed). Each value is either an
+    object with date / weight keys or a [date, weight] pair.
+
+    Raises:
+    ValueError: If a JSON array upload isn't valid JSON
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig")
+
+    # Peek at the first non-blank line to tell an array from JSON Lines
+    line_number, first_line = 1, text.readline()
+    while first_line and not first_line.strip():
+        line_number, first_line = line_number + 1, text.readline()
+
+    if not first_line:
+        return
+    # A first line that is a complete JSON value on its own starts JSON Lines (a [date, weight] pair
+    # included), only a "[" that doesn't close on the first line opens a multi-line array
+    try:
+        first_value, multiline_array = json.loads(first_line), False
+    except ValueError:
+        first_value, multiline_array = None, first_line.lstrip().startswith("[")
+
+    if multiline_array:
+        values = enumerate(json.loads(first_line + text.read()), start=1)
+    elif isinstance(first_value, list) and all(isinstance(value, (dict, list)) for value in first_value):
+        # A whole array of entries on one line
+        values = enumerate(first_value, start=1)
+    else:
+        # JSON Lines, the first value is already decoded (None if it is malformed)
+        lines = enumerate(text, start=line_number + 1)
+        values = itertools.chain([(line_number, first_value)],
+                                 ((number, _loads_or_none(line)) for number, line in lines if line.strip()))
+
+    for row_number, value in values:
+        if isinstance(value, dict):
+            yield row_number, _pick(value, DATE_COLUMNS), _pick(value, WEIGHT_COLUMNS)
+        elif isinstance(value, list) and len(value) == 2:
+            yield row_number, value[0], value[1]
+        else:
+            yield row_number, None, None
+
+
+def import_weight_entries(db, user_id, unit_system, rows, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Validate and store weight entries for one user.
+
+    Weights are given in the user's unit system and stored in kg rounded to one decimal place,
+    exactly like a single progresshub entry.
+
+    Parameters:
+    db (Database): The application's database
+    user_id (int): Owner of the entries
+    unit_system (str): 'metric' or 'imperial'
+    rows (iterable): (row_number, date, weight) tuples, e.g. from iter_csv_rows()
+    chunk_size (int): Rows written per transaction
+
+    Returns:
+    dict: 'imported' and 'rejected' counts, 'errors', a list of {'row', 'errors'} dicts,
+          'first_date', the earliest imported date (None if nothing was imported), and 'unreadable',
+          True if the file broke off (bad encoding / JSON / CSV); the valid rows before that are kept
+    """
+    report = {"imported": 0, "rejected": 0, "errors": [], "first_date": None, "unreadable": False}
+    chunk = []
+
+    def flush():
+        with db.transaction() as conn:
+            conn.executemany(UPSERT_WEIGHT_ENTRY_SQL, chunk)
+        report["imported"] += len(chunk)
+        chunk.clear()
+
+    try:
+        for row_number, date_recorded, weight in rows:
+            values, errors = WEIGHT_ENTRY_SCHEMA.validate(
+                {"weight": weight, "unit_system": unit_system, "date_recorded": date_recorded})
+            if errors:
+                report["rejected"] += 1
+                if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                    report["errors"].append({"row": row_number, "errors": errors})
+                continue
+
+            weight = values["weight"]
+            date_recorded = values["date_recorded"].isoformat()
+            # Convert weight to kg if the unit is lb
+            if unit_system == 'imperial':
+                weight_kg = round(weight * 0.453592, 1)
+            else:
+                weight_kg = round(weight, 1)
+
+            chunk.append((user_id, weight_kg, date_recorded))
+            if report["first_date"] is None or date_recorded < report["first_date"]:
+                report["first_date"] = date_recorded
+            if len(chunk) >= chunk_size:
+                flush()
+    except (ValueError, csv.Error):
+        # Bad encoding / JSON / CSV: earlier chunks are committed already, keep the valid rows up to here
+        report["unreadable"] = True
+
+    if chunk:
+        flush()
+    return report
+
+
+def iter_weight_entries(db, user_id, unit_system, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yield a user's weight entries oldest first, converted to their unit system.
+
+    The rows are fetched in keyset batches of `batch_size` (the same query as the paged table),
+    each on its own pooled connection, so no connection is held while the rows are yielded to a
+    slow download.
+
+    Yields:
+    tuple: (date_recorded, weight, unit)
+    """
+    unit = 'lb' if unit_system == 'imperial' else 'kg'
+    last = (MIN_DATE, 0)
+    while True:
+        rows = db.execute(ENTRIES_AFTER_SQL, user_id, MIN_DATE, MAX_DATE, *last, batch_size)
+        for row in rows:
+            if unit_system == 'imperial':
+                yield row['date_recorded'], round(row['weight_kg'] / 0.453592, 1), unit
+            else:
+                yield row['date_recorded'], round(row['weight_kg'], 1), unit
+        if len(rows) < batch_size:
+            return
+        last = rows[-1]['date_recorded'], rows[-1]['id']
+
+
+def export_weight_entries(db, user_id, unit_system, file_format, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Stream a user's weight history as CSV or NDJSON text.
+
+    The CSV has a date,weight,unit header, so an export can be imported again as is.
+
+    Parameters:
+    db (Database): The application's database
+    user_id (int): Owner of the entries
+    unit_system (str): 'metric' or 'imperial'
+    file_format (str): One of EXPORT_FORMATS
+    batch_size (int): Rows per query and per yielded chunk
+
+    Yields:
+    str: Chunks of the export
+    """
+    if file_format == "csv":
+        yield "date,weight,unit\r\n"
+
+    batch = []
+    for date_recorded, weight, unit in iter_weight_entries(db, user_id, unit_system, batch_size):
+        if file_format == "csv":
+            batch.append(f"{date_recorded},{weight},{unit}\r\n")
+        else:
+            batch.append(json.dumps({"date": date_recorded, "weight": weight, "unit": unit}) + "\n")
+        if len(batch) >= batch_size:
+            yield "".join(batch)
+            batch.clear()
+
+    if batch:
+        yield "".join(batch)
+
+
+def encode_cursor(entry):
+    """Build the pagination cursor pointing at an entry."""
+    return f"{entry['date_recorded']},{entry['id']}"
+
+
+def decode_cursor(cursor):
+    """
+    Split a pagination cursor into (date_recorded, id).
+
+    Raises:
+    ValueError: If the cursor wasn't produced by encode_cursor()
+    """
+    date_recorded, entry_id = cursor.split(",")
+    parse_iso_date(date_recorded)
+    return date_recorded, int(entry_id)
+
+
+def fetch_weight_entries_page(db, user_id, unit_system, start=None, end=None, after=None, before=None, limit=PAGE_SIZE):
+    """
+    Fetch one page of a user's weight entries, oldest first within the page.
+
+    With an `after` cursor the page continues forward in time, otherwise it ends at the `before`
+    cursor or, without any cursor, at the newest entry in the range.
+
+    Parameters:
+    db (Database): The application's database
+    user_id (int): Owner of the entries
+    unit_system (str): 'metric' or 'imperial'
+    start (str): First date of the range (YYYY-MM-DD), open if None
+    end (str): Last date of the range (YYYY-MM-DD), open if None
+    after (str): Cursor of the entry the page starts after
+    before (str): Cursor of the entry the page ends before
+    limit (int): Max. number of entries
+
+    Returns:
+    dict: 'entries' as dicts like the progresshub table uses, 'next_cursor' to continue in the
+          same direction (None when there is nothing left)
+    """
+    start, end = start or MIN_DATE, end or MAX_DATE
+
+    # Fetch one extra row to know whether another page follows
+    if after:
+        rows = db.execute(ENTRIES_AFTER_SQL, user_id, start, end, *decode_cursor(after), limit + 1)
+    else:
+        cursor = decode_cursor(before) if before else (MAX_DATE, MAX_ID)
+        rows = db.execute(ENTRIES_BEFORE_SQL, user_id, start, end, *cursor, limit + 1)
+
+    has_more = len(rows) > limit
+    entries = rows[:limit]
+    if not after:
+        entries.reverse()
+
+    # Convert weights to user's preferred unit system for display
+    for entry in entries:
+        if unit_system == 'imperial':
+            entry['weight'] = round(entry['weight_kg'] / 0.453592, 1)
+            entry['unit'] = 'lb'
+        else:
+            entry['weight'] = round(entry['weight_kg'], 1)
+            entry['unit'] = 'kg'
+
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor(entries[-1] if after else entries[0])
+    return {"entries": entries, "next_cursor": next_cursor}
@@ -0,0 +1,248 @@
+"""
+This module provides versioned schema migrations and a startup query-plan audit.
+
+Migrations are tracked with SQLite's built-in PRAGMA user_version: every entry in MIGRATIONS
+has a version number and is applied exactly once, in order, inside its own write transaction.
+
+The audit collects every SQL string literal passed to .execute() / .executemany() in the given
+source files, runs EXPLAIN QUERY PLAN on it and raises if SQLite would fall back to a full
+table scan. It runs on every start so a new query without a matching index can't ship unnoticed.
+"""
+import ast
+import re
+
+DUPLICATE_ENTRIES_SQL = (
+    "SELECT user_id, date_recorded, COUNT(DISTINCT weight_kg), GROUP_CONCAT(id), MAX(id) FROM weight_entries "
+    "GROUP BY user_id, date_recorded HAVING COUNT(*) > 1 ORDER BY user_id, date_recorded"
+)
+DUPLICATE_USERNAMES_SQL = "SELECT username FROM users GROUP BY username HAVING COUNT(*) > 1"
+
+
+def dedupe_weight_entries(conn, log):
+    """
+    Migration step: remove repeated (user_id, date_recorded) weight entries before the unique index.
+
+    Duplicates that agree on the weight are collapsed into the newest row and every removed row
+    is logged. Duplicates with different weights can't be resolved safely, so the migration
+    refuses to run and names them.
+    """
+    duplicates = conn.execute(DUPLICATE_ENTRIES_SQL).fetchall()
+    conflicts = [f"user {user_id} on {day} (entries {ids.replace(',', ', ')})"
+                 for user_id, day, weights, ids, _ in duplicates if weights > 1]
+    if conflicts:
+        raise RuntimeError(
+            "Can't add the unique (user_id, date_recorded) index, these days have several entries with different "
+            "weights, keep one of each and delete the others: " + "; ".join(conflicts))
+
+    removed = {}
+    for user_id, day, _, ids, newest in duplicates:
+        stale = sorted(int(entry_id) for entry_id in ids.split(",") if int(entry_id) != newest)
+        conn.executemany("DELETE FROM weight_entries WHERE id = ?", [(entry_id,) for entry_id in stale])
+        removed.setdefault(user_id, []).extend(stale)
+    for user_id, entry_ids in removed.items():
+        log(f"Migration 1: removed {len(entry_ids)} duplicate weight entries of user {user_id} "
+            f"(same weight as the newest entry of that day): ids {', '.join(map(str, entry_ids))}")
+
+
+def check_unique_usernames(conn, log):
+    """Migration step: refuse to guess which duplicate account to keep before the unique username index."""
+    duplicates = [row[0] for row in conn.execute(DUPLICATE_USERNAMES_SQL).fetchall()]
+    if duplicates:
+        raise RuntimeError(
+            f"Can't add the unique username index, these usernames are used more than once: {', '.join(duplicates)}")
+
+
+# (version, description, statements) - statements are SQL strings or callables taking the connection
+# and a log function. Never edit a migration that has shipped, append a new one instead.
+MIGRATIONS = [
+    (1, "unique (user_id, date_recorded) index on weight_entries", [
+        # Keep only the newest row per user and day so the unique index can be created
+        dedupe_weight_entries,
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_weight_entries_user_date ON weight_entries (user_id, date_recorded)",
+    ]),
+    (2, "updated_at on weight_entries", [
+        # NULL until the entry is overwritten, lets the progresshub upsert tell an insert from an update
+        "ALTER TABLE weight_entries ADD COLUMN updated_at TEXT",
+    ]),
+    (3, "trend analytics: weight_entries.trend_kg and weight_trends", [
+        # The trend values of the existing entries are filled by the backfill passed to migrate()
+        "ALTER TABLE weight_entries ADD COLUMN trend_kg REAL",
+        """CREATE TABLE IF NOT EXISTS weight_trends (
+            user_id INTEGER PRIMARY KEY,
+            as_of TEXT NOT NULL,
+            trend_kg REAL NOT NULL,
+            average_7d_kg REAL NOT NULL,
+            weekly_rate_kg REAL,
+            projected_kg REAL,
+            projected_date TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )""",
+    ]),
+    (4, "sessions table for the sqlite session backend", [
+        "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL) WITHOUT ROWID",
+        "CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at)",
+    ]),
+    (5, "unique index on users.username", [
+        check_unique_usernames,
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON users (username)",
+    ]),
+    (6, "strength_scores for the traininghub percentile index", [
+        # seq orders the score changes for the index's incremental refresh
+        """CREATE TABLE IF NOT EXISTS strength_scores (
+            user_id INTEGER PRIMARY KEY,
+            score REAL NOT NULL,
+            fitness_level TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_strength_scores_seq ON strength_scores (seq)",
+    ]),
+    (7, "strength_entries: lifts logged in the traininghub", [
+        # One row per user, lift and day
+        """CREATE TABLE IF NOT EXISTS strength_entries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            lift TEXT NOT NULL,
+            date_recorded TEXT NOT NULL,
+            weight_kg REAL NOT NULL,
+            reps INTEGER NOT NULL DEFAULT 1,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )""",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_strength_entries_user_lift_date "
+        "ON strength_entries (user_id, lift, date_recorded)",
+    ]),
+]
+
+# Queries that are known to scan and are tracked separately. Keep this list short.
+AUDIT_ALLOWED_SCANS = {
+    # trend backfill walks every user on purpose, only run from the CLI
+    "SELECT id FROM users WHERE EXISTS (SELECT 1 FROM weight_entries WHERE user_id = users.id)",
+    # the username Bloom filter reads every name once at startup
+    "SELECT username FROM users",
+    # the strength percentile index loads every score once, afterwards it only reads changes
+    "SELECT user_id, score, seq FROM strength_scores",
+}
+
+# Plan rows look like "SCAN weight_entries" (or "SCAN TABLE weight_entries" before SQLite 3.36)
+_SCAN_PATTERN = re.compile(r"^SCAN (TABLE )?\w+")
+
+
+class QueryPlanError(RuntimeError):
+    """Raised when a query in the application would run as a full table scan."""
+
+
+def schema_version(db):
+    """Return the schema version stored in the database."""
+    return db.execute("PRAGMA user_version")[0]["user_version"]
+
+
+def migrate(db, backfills=None, log=print):
+    """
+    Apply all pending migrations.
+
+    Each migration runs in its own transaction and re-checks the version after taking the
+    write lock, so several workers starting at once apply every migration only once.
+
+    Data that needs application code (e.g. the trend values of migration 3) is filled by
+    backfills, so this module doesn't depend on the feature modules.
+
+    Parameters:
+    db (Database): The application's database
+    backfills (dict): Optional version -> callable(conn), run after that migration's statements in its transaction
+    log (callable): Receives a message for every change a migration makes to existing rows
+
+    Returns:
+    int: The schema version after migrating
+    """
+    for version, description, statements in MIGRATIONS:
+        with db.transaction() as conn:
+            current = conn.execute("PRAGMA user_version").fetchone()[0]
+            if current >= version:
+                continue
+            for statement in statements:
+                if callable(statement):
+                    statement(conn, log)
+                else:
+                    conn.execute(statement)
+            if backfills and version in backfills:
+                backfills[version](conn)
+            # PRAGMA doesn't accept placeholders, version is an int from MIGRATIONS
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+    return schema_version(db)
+
+
+def collect_queries(paths):
+    """
+    Collect the SQL string literals passed to .execute() / .executemany() in Python source files.
+
+    Module-level string constants passed by name (e.g. db.execute(SOME_SQL, ...)) are resolved too.
+
+    Parameters:
+    paths (list): Paths of the Python files to scan
+
+    Returns:
+    list: (location, sql) tuples in source order, location being "file:line"
+    """
+    queries = []
+    for path in paths:
+        with open(path, encoding="utf-8") as file:
+            tree = ast.parse(file.read(), filename=path)
+
+        constants = {}
+        for node in tree.body:
+            if (isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant)
+                    and isinstance(node.value.value, str)):
+                for target in node.targets:
+                    if isinstance(target, ast.Name):
+                        constants[target.id] = node.value.value
+
+        for node in ast.walk(tree):
+            if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                    and node.func.attr in ("execute", "executemany") and node.args):
+                continue
+            first = node.args[0]
+            if isinstance(first, ast.Constant) and isinstance(first.value, str):
+                sql = first.value
+            elif isinstance(first, ast.Name) and first.id in constants:
+                sql = constants[first.id]
+            else:
+                continue
+            queries.append((f"{path}:{node.lineno}", sql))
+    return queries
+
+
+def explain(db, sql):
+    """
+    Return the EXPLAIN QUERY PLAN detail lines for a statement.
+
+    Placeholders are bound to NULL, the plan only depends on the statement's shape.
+    """
+    params = [None] * sql.count("?")
+    return [row["detail"] for row in db.execute(f"EXPLAIN QUERY PLAN {sql}", *params)]
+
+
+def audit_query_plans(db, paths):
+    """
+    Fail loudly if any query in the given source files would do a full table scan.
+
+    Parameters:
+    db (Database): The application's database, already migrated
+    paths (list): Paths of the Python files whose queries should be checked
+
+    Raises:
+    QueryPlanError: Listing every offending query with its location and plan
+    """
+    problems = []
+    for location, sql in collect_queries(paths):
+        normalized = " ".join(sql.split())
+        if normalized.split(" ", 1)[0].upper() in ("PRAGMA", "BEGIN", "COMMIT", "ROLLBACK", "CREATE", "ALTER", "DROP"):
+            continue
+        if normalized in AUDIT_ALLOWED_SCANS:
+            continue
+        scans = [detail for detail in explain(db, sql) if _SCAN_PATTERN.match(detail)]
+        if scans:
+            problems.append(f"{location}: {normalized}\n    -> {'; '.join(scans)}")
+
+    if problems:
+        raise QueryPlanError(
+            "Queries without a usable index (add an index in schema.MIGRATIONS):\n" + "\n".join(problems))
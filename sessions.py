@@ -0,0 +1,217 @@
+"""
+This module provides FitHub's pluggable session backends.
+
+    - "sqlite": server-side sessions in the sessions table of fithub.db, shared by every worker / node
+                that uses the same database file
+    - "memory": server-side sessions in an in-process LRU with TTL, fastest but single-process only
+    - "cookie": Flask's signed-cookie sessions, nothing stored on the server (needs a stable SECRET_KEY)
+
+Server-side sessions only hand the browser a random session id. The session data is written back
+only when it changed (or when its expiry needs pushing out), and a background thread removes
+expired sessions so the store can't grow without bound.
+"""
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSessionInterface, SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+SESSION_BACKENDS = ("sqlite", "memory", "cookie")
+SESSION_GC_INTERVAL = 300       # seconds between purges of expired server-side sessions
+MEMORY_SESSION_LIMIT = 10000    # sessions kept by the memory backend before the least recently used are evicted
+
+LOAD_SESSION_SQL = "SELECT data, expires_at FROM sessions WHERE id = ?"
+SAVE_SESSION_SQL = (
+    "INSERT INTO sessions (id, data, expires_at) VALUES (?, ?, ?) "
+    "ON CONFLICT(id) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at"
+)
+DELETE_SESSION_SQL = "DELETE FROM sessions WHERE id = ?"
+PURGE_SESSIONS_SQL = "DELETE FROM sessions WHERE expires_at < ?"
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session dict that remembers its id and whether it was changed during the request."""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(session):
+            session.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+
+class SQLiteSessionStore:
+    """Sessions stored in the sessions table through the application's connection pool."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def load(self, sid):
+        """Return (data, expires_at) for a live session, None if it doesn't exist or has expired."""
+        rows = self.db.execute(LOAD_SESSION_SQL, sid)
+        if not rows or rows[0]['expires_at'] < time.time():
+            return None
+        return rows[0]['data'], rows[0]['expires_at']
+
+    def save(self, sid, data, expires_at):
+        self.db.execute(SAVE_SESSION_SQL, sid, data, expires_at)
+
+    def delete(self, sid):
+        self.db.execute(DELETE_SESSION_SQL, sid)
+
+    def purge_expired(self):
+        """Delete every expired session and return how many there were."""
+        return self.db.execute(PURGE_SESSIONS_SQL, time.time())
+
+
+class MemorySessionStore:
+    """Sessions kept in process memory, least recently used evicted beyond max_entries."""
+
+    def __init__(self, max_entries=MEMORY_SESSION_LIMIT):
+        self.max_entries = max_entries
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, sid):
+        with self._lock:
+            entry = self._sessions.get(sid)
+            if entry is None:
+                return None
+            if entry[1] < time.time():
+                del self._sessions[sid]
+                return None
+            self._sessions.move_to_end(sid)
+            return entry
+
+    def save(self, sid, data, expires_at):
+        with self._lock:
+            self._sessions[sid] = (data, expires_at)
+            self._sessions.move_to_end(sid)
+            while len(self._sessions) > self.max_entries:
+                self._sessions.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._sessions.pop(sid, None)
+
+    def purge_expired(self):
+        now = time.time()
+        with self._lock:
+            expired = [sid for sid, (_, expires_at) in self._sessions.items() if expires_at < now]
+            for sid in expired:
+                del self._sessions[sid]
+        return len(expired)
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """
+    Session interface for the server-side stores.
+
+    Parameters:
+    store (SQLiteSessionStore | MemorySessionStore): Where the session data lives
+    ttl (float): Seconds a session lives after it was last saved
+    """
+    serializer = TaggedJSONSerializer()  # same format as Flask's cookie sessions (handles tuples, bytes, ...)
+
+    def __init__(self, store, ttl):
+        self.store = store
+        self.ttl = ttl
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            stored = self.store.load(sid)
+            if stored is not None:
+                session = ServerSideSession(self.serializer.loads(stored[0]), sid=sid)
+                session.expires_at = stored[1]
+                return session
+        return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        cookie_name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        # An emptied session (e.g. logout) is removed from the store and the browser
+        if not session:
+            if not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(cookie_name, domain=domain, path=path)
+            return
+
+        # Only write when the data changed or less than half of the lifetime is left
+        now = time.time()
+        stale = getattr(session, "expires_at", 0) - now < self.ttl / 2
+        if session.modified or session.new or stale:
+            self.store.save(session.sid, self.serializer.dumps(dict(session)), now + self.ttl)
+
+        if session.new:
+            response.set_cookie(
+                cookie_name,
+                session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+
+
+def start_session_gc(store, interval=SESSION_GC_INTERVAL):
+    """
+    Purge expired sessions from a store every `interval` seconds in a daemon thread.
+
+    Returns:
+    threading.Event: Set it to stop the thread
+    """
+    stop = threading.Event()
+
+    def collect():
+        while not stop.wait(interval):
+            try:
+                store.purge_expired()
+            except Exception:
+                # A busy database must not kill the collector, it simply tries again next round
+                pass
+
+    threading.Thread(target=collect, name="session-gc", daemon=True).start()
+    return stop
+
+
+def init_sessions(app, db, backend, ttl, gc_interval=SESSION_GC_INTERVAL):
+    """
+    Install the configured session backend on the app.
+
+    Parameters:
+    app (Flask): The application
+    db (Database): The application's database, used by the sqlite backend
+    backend (str): One of SESSION_BACKENDS
+    ttl (float): Lifetime of server-side sessions in seconds
+    gc_interval (float): Seconds between purges of expired sessions, 0 disables the collector
+
+    Raises:
+    RuntimeError: The cookie backend is selected and the app has no secret key
+    ValueError: Unknown backend
+    """
+    if backend == "cookie":
+        if not app.secret_key:
+            raise RuntimeError("The cookie session backend needs a SECRET_KEY (set FITHUB_SECRET_KEY).")
+        app.session_interface = SecureCookieSessionInterface()
+        return
+
+    if backend == "sqlite":
+        store = SQLiteSessionStore(db)
+    elif backend == "memory":
+        store = MemorySessionStore()
+    else:
+        raise ValueError(f"Unknown session backend '{backend}', use one of {', '.join(SESSION_BACKENDS)}")
+
+    app.session_interface = ServerSideSessionInterface(store, ttl)
+    if gc_interval:
+        start_session_gc(store, gc_interval)
@@ -0,0 +1,170 @@
+"""
+This module classifies lifters against the strength standards and ranks them within the user base.
+
+    - the STRENGTH_STANDARDS ratios from helpers.py are turned into one NumPy table once, so whole
+      batches of (gender, bodyweight, squat, bench, deadlift) rows are classified at once
+    - every lifter also gets a strength score: their lift / bodyweight ratios relative to the
+      advanced standard of their gender, averaged over the three lifts (1.0 = advanced on average),
+      which makes men and women comparable on one scale
+    - StrengthIndex keeps every user's latest score in a sorted array, so "stronger than X% of
+      users" is a binary search instead of a scan. It is loaded once and then refreshed
+      incrementally from the rows changed since (strength_scores.seq), including other workers' writes
+"""
+import threading
+import time
+
+import numpy as np
+
+from helpers import STRENGTH_STANDARDS
+
+LIFTS = ("squat", "bench", "deadlift")
+GENDERS = ("male", "female")
+FITNESS_LEVELS = ("beginner", "intermediate", "advanced")
+INDEX_REFRESH_INTERVAL = 30     # seconds between incremental refreshes of the percentile index
+INDEX_REBUILD_THRESHOLD = 256   # more changes than this at once are applied by re-sorting
+
+# RATIO_TABLE[gender, level, lift], level 0 = intermediate, 1 = advanced
+RATIO_TABLE = np.array([
+    [[STRENGTH_STANDARDS[gender][level][lift] for lift in LIFTS] for level in FITNESS_LEVELS[1:]]
+    for gender in GENDERS
+])
+
+ALL_SCORES_SQL = "SELECT user_id, score, seq FROM strength_scores"
+CHANGED_SCORES_SQL = "SELECT user_id, score, seq FROM strength_scores WHERE seq > ? ORDER BY seq"
+UPSERT_SCORE_SQL = (
+    "INSERT INTO strength_scores (user_id, score, fitness_level, seq) "
+    "VALUES (?, ?, ?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM strength_scores)) "
+    "ON CONFLICT(user_id) DO UPDATE SET score = excluded.score, fitness_level = excluded.fitness_level, "
+    "seq = excluded.seq"
+)
+
+
+def _lift_ratios(gender, bodyweight, squat, bench, deadlift):
+    """Gender index per lifter and the (n, 3) lift / bodyweight ratios."""
+    gender = np.asarray(gender, dtype=str)
+    if not np.isin(gender, GENDERS).all():
+        raise ValueError("Gender must be 'male' or 'female'")
+    genders = (gender == 'female').astype(np.intp)
+    lifts = np.column_stack([np.asarray(squat, dtype=np.float64), np.asarray(bench, dtype=np.float64),
+                             np.asarray(deadlift, dtype=np.float64)])
+    return genders, lifts / np.asarray(bodyweight, dtype=np.float64)[:, None]
+
+
+def classify_batch(gender, bodyweight, squat, bench, deadlift):
+    """
+    Fitness level of every lifter, same rules as calculate_fitness_level.
+
+    Parameters:
+    gender (array): 'male' / 'female' per lifter
+    bodyweight, squat, bench, deadlift (array): kg per lifter
+
+    Returns:
+    ndarray: 'beginner', 'intermediate' or 'advanced' per lifter
+    """
+    genders, ratios = _lift_ratios(gender, bodyweight, squat, bench, deadlift)
+    # A level counts only if every lift meets its ratio, the number of levels met indexes FITNESS_LEVELS
+    met = (ratios[:, None, :] >= RATIO_TABLE[genders]).all(axis=2)
+    levels = np.where(met[:, 1], 2, np.where(met[:, 0], 1, 0))
+    return np.array(FITNESS_LEVELS)[levels]
+
+
+def strength_scores_batch(gender, bodyweight, squat, bench, deadlift):
+    """Strength score of every lifter: mean of lift / bodyweight over the advanced ratio of their gender."""
+    genders, ratios = _lift_ratios(gender, bodyweight, squat, bench, deadlift)
+    return (ratios / RATIO_TABLE[genders, 1]).mean(axis=1)
+
+
+class StrengthIndex:
+    """
+    Sorted strength scores of all users for percentile lookups.
+
+    Parameters:
+    db (Database): The application's database
+    refresh_interval (float): Seconds between incremental refreshes from the database
+    """
+
+    def __init__(self, db, refresh_interval=INDEX_REFRESH_INTERVAL):
+        self.db = db
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._scores = {}                   # user_id -> score
+        self._sorted = np.empty(0)
+        self._seq = 0                       # highest seq applied
+        self._refreshed_at = float("-inf")
+
+    def _apply(self, rows):
+        """Apply (user_id, score, seq) rows, caller holds the lock."""
+        if len(rows) > INDEX_REBUILD_THRESHOLD:
+            for user_id, score, seq in rows:
+                self._scores[user_id] = score
+            self._sorted = np.sort(np.fromiter(self._scores.values(), np.float64, len(self._scores)))
+        else:
+            for user_id, score, seq in rows:
+                old = self._scores.get(user_id)
+                if old is not None:
+                    self._sorted = np.delete(self._sorted, np.searchsorted(self._sorted, old))
+                self._scores[user_id] = score
+                self._sorted = np.insert(self._sorted, np.searchsorted(self._sorted, score), score)
+        if rows:
+            self._seq = max(self._seq, rows[-1][2])
+
+    def refresh(self, force=False):
+        """Apply the scores changed since the last refresh (at most every refresh_interval seconds)."""
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._refreshed_at < self.refresh_interval:
+                return
+            self._refreshed_at = now
+            seq, loaded = self._seq, bool(self._scores)
+
+        # Read without the lock so lookups aren't blocked by the database, only the swap-in is locked
+        with self.db.connection() as conn:
+            if seq == 0 and not loaded:
+                rows = sorted(conn.execute(ALL_SCORES_SQL).fetchall(), key=lambda row: row[2])
+            else:
+                rows = conn.execute(CHANGED_SCORES_SQL, (seq,)).fetchall()
+
+        with self._lock:
+            # Another thread may have applied some of these rows in the meantime
+            self._apply([row for row in rows if row[2] > self._seq])
+
+    def record(self, user_id, score, fitness_level):
+        """Store a user's latest score and put it into the index right away."""
+        with self.db.transaction() as conn:
+            conn.execute(UPSERT_SCORE_SQL, (user_id, score, fitness_level))
+        # Pick up this write (and anything other workers wrote before it) in seq order
+        self.refresh(force=True)
+
+    def percentiles(self, scores, members=False):
+        """
+        Share of users with a lower score, in percent.
+
+        Parameters:
+        scores (array): Strength scores
+        members (bool): The scores belong to users in the index, compare each only to the other users
+
+        Returns:
+        ndarray: Percentiles, None when there is nobody to compare with
+        """
+        self.refresh()
+        with self._lock:
+            lower = np.searchsorted(self._sorted, np.asarray(scores, dtype=np.float64), side='left')
+            others = len(self._sorted) - (1 if members else 0)
+        if others <= 0:
+            return None
+        return np.minimum(lower / others * 100, 100)
+
+
+def strength_report_batch(index, gender, bodyweight, squat, bench, deadlift):
+    """
+    Classify a batch of lifters and rank them within the user base.
+
+    Returns:
+    dict: 'fitness_level', 'score' and 'percentile' arrays ('percentile' is None for an empty index)
+    """
+    scores = strength_scores_batch(gender, bodyweight, squat, bench, deadlift)
+    return {
+        "fitness_level": classify_batch(gender, bodyweight, squat, bench, deadlift),
+        "score": scores,
+        "percentile": index.percentiles(scores),
+    }
@@ -0,0 +1,116 @@
+"""
+This module stores the lifts entered in the Training Hub and serves their history for the lift charts.
+
+Every traininghub submission is logged as one strength_entries row per lift and day (a second
+submission on the same day overwrites it), under a unique (user_id, lift, date_recorded) index
+that also serves every read here.
+
+The history of a lift is returned as
+    - its estimated one-rep max per entry (Epley formula for sets of more than one rep)
+    - a trend line, the same exponentially weighted moving average the progresshub uses
+both reduced to a point budget with chart_data.downsample, so long logs stay cheap to draw.
+"""
+import numpy as np
+
+from chart_data import downsample, series_points
+from strength import LIFTS
+from trends import TREND_SMOOTHING
+
+UPSERT_LIFT_SQL = (
+    "INSERT INTO strength_entries (user_id, lift, date_recorded, weight_kg, reps) VALUES (?, ?, ?, ?, ?) "
+    "ON CONFLICT(user_id, lift, date_recorded) DO UPDATE SET weight_kg = excluded.weight_kg, reps = excluded.reps"
+)
+LATEST_LIFT_SQL = (
+    "SELECT weight_kg FROM strength_entries WHERE user_id = ? AND lift = ? ORDER BY date_recorded DESC LIMIT 1"
+)
+LIFT_SERIES_SQL = (
+    "SELECT date_recorded, weight_kg, reps FROM strength_entries "
+    "WHERE user_id = ? AND lift = ? AND date_recorded <= ? ORDER BY date_recorded"
+)
+
+
+def estimated_1rm(weight_kg, reps):
+    """Estimated one-rep max (Epley), a single rep is taken as is."""
+    return np.where(reps > 1, weight_kg * (1 + reps / 30), weight_kg)
+
+
+def log_lifts(db, user_id, date_recorded, lifts, reps=1):
+    """
+    Store a day's lifts, replacing what was logged for that day before.
+
+    Parameters:
+    db (Database): The application's database
+    user_id (int): Owner of the entries
+    date_recorded (str): Date (YYYY-MM-DD)
+    lifts (dict): Lift name (one of LIFTS) -> weight in kg
+    reps (int): Repetitions the weights were lifted for
+    """
+    with db.transaction() as conn:
+        conn.executemany(UPSERT_LIFT_SQL, [
+            (user_id, lift, date_recorded, weight_kg, reps) for lift, weight_kg in lifts.items()
+        ])
+
+
+def latest_lifts(db, user_id):
+    """
+    The most recently logged weight of every lift.
+
+    Returns:
+    dict: Lift name -> weight in kg, None for lifts never logged
+    """
+    latest = {}
+    with db.connection() as conn:
+        for lift in LIFTS:
+            row = conn.execute(LATEST_LIFT_SQL, (user_id, lift)).fetchone()
+            latest[lift] = row[0] if row else None
+    return latest
+
+
+def lift_history(db, user_id, unit_system, lifts, start, end, max_points, period="auto"):
+    """
+    Estimated 1RM and its trend per lift between two dates, downsampled for the chart.
+
+    The trend is computed over the whole log up to `end`, so it doesn't depend on the window.
+
+    Parameters:
+    db (Database): The application's database
+    user_id (int): Owner of the entries
+    unit_system (str): 'metric' or 'imperial'
+    lifts (list): Lift names to return
+    start (str): First date (YYYY-MM-DD)
+    end (str): Last date (YYYY-MM-DD)
+    max_points (int): Point budget per series
+    period (str): One of chart_data.PERIODS
+
+    Returns:
+    dict: 'lifts' as {lift: {'e1rm': points, 'trend': points, 'period', 'total'}} and 'unit'
+    """
+    factor = 1 / 0.453592 if unit_system == 'imperial' else 1
+    start_day = np.datetime64(start, "D").astype(np.int64)
+    history = {}
+    with db.connection() as conn:
+        for lift in lifts:
+            rows = conn.execute(LIFT_SERIES_SQL, (user_id, lift, end)).fetchall()
+            if not rows:
+                history[lift] = {"e1rm": [], "trend": [], "period": "day", "total": 0}
+                continue
+
+            dates, weights_kg, reps = zip(*rows)
+            days = np.array(dates, dtype="datetime64[D]").astype(np.int64)
+            e1rm = estimated_1rm(np.array(weights_kg, dtype=np.float64), np.array(reps)) * factor
+            trend = np.empty_like(e1rm)
+            trend[0] = e1rm[0]
+            for i in range(1, len(e1rm)):
+                trend[i] = trend[i - 1] + TREND_SMOOTHING * (e1rm[i] - trend[i - 1])
+
+            visible = days >= start_day
+            days, e1rm, trend = days[visible], e1rm[visible], trend[visible]
+            e1rm_days, e1rm, used_period = downsample(days, e1rm, max_points, period)
+            trend_days, trend, _ = downsample(days, trend, max_points, used_period)
+            history[lift] = {
+                "e1rm": series_points(e1rm_days, e1rm),
+                "trend": series_points(trend_days, trend),
+                "period": used_period,
+                "total": len(days),
+            }
+    return {"lifts": history, "unit": 'lb' if unit_system == 'imperial' else 'kg'}
@@ -0,0 +1,151 @@
+"""
+This module maintains the progresshub trend analytics incrementally.
+
+Every weight entry stores its trend weight (an exponentially weighted moving average, like the
+"Hacker's Diet" trend line), and weight_trends holds one summary row per user:
+    - trend weight at the latest entry
+    - average of the entries logged in the last 7 days
+    - weekly rate of change of the trend
+    - projected weight PROJECTION_DAYS after the latest entry at that rate
+
+When an entry changes, only the trend values from its date onwards are recomputed, so logging
+today's weight touches a single row, and the summary is refreshed with a few indexed lookups.
+Reading the analytics is then a single primary-key lookup per user.
+"""
+from datetime import date, timedelta
+
+TREND_SMOOTHING = 0.1       # weight of the newest entry in the trend (EWMA alpha)
+MOVING_AVERAGE_DAYS = 7
+PROJECTION_DAYS = 28
+
+PREVIOUS_TREND_SQL = (
+    "SELECT trend_kg FROM weight_entries WHERE user_id = ? AND date_recorded < ? "
+    "ORDER BY date_recorded DESC LIMIT 1"
+)
+ENTRIES_FROM_SQL = (
+    "SELECT id, weight_kg FROM weight_entries WHERE user_id = ? AND date_recorded >= ? ORDER BY date_recorded"
+)
+UPDATE_TREND_SQL = "UPDATE weight_entries SET trend_kg = ? WHERE id = ?"
+LATEST_ENTRY_SQL = (
+    "SELECT date_recorded, trend_kg FROM weight_entries WHERE user_id = ? ORDER BY date_recorded DESC LIMIT 1"
+)
+REFERENCE_ENTRY_SQL = (
+    "SELECT date_recorded, trend_kg FROM weight_entries WHERE user_id = ? AND date_recorded <= ? "
+    "ORDER BY date_recorded DESC LIMIT 1"
+)
+RECENT_AVERAGE_SQL = (
+    "SELECT AVG(weight_kg) FROM weight_entries WHERE user_id = ? AND date_recorded > ? AND date_recorded <= ?"
+)
+UPSERT_SUMMARY_SQL = (
+    "INSERT INTO weight_trends (user_id, as_of, trend_kg, average_7d_kg, weekly_rate_kg, projected_kg, projected_date) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT(user_id) DO UPDATE SET as_of = excluded.as_of, trend_kg = excluded.trend_kg, "
+    "average_7d_kg = excluded.average_7d_kg, weekly_rate_kg = excluded.weekly_rate_kg, "
+    "projected_kg = excluded.projected_kg, projected_date = excluded.projected_date"
+)
+DELETE_SUMMARY_SQL = "DELETE FROM weight_trends WHERE user_id = ?"
+SUMMARY_SQL = "SELECT * FROM weight_trends WHERE user_id = ?"
+USERS_WITH_ENTRIES_SQL = "SELECT id FROM users WHERE EXISTS (SELECT 1 FROM weight_entries WHERE user_id = users.id)"
+FIRST_DATE = "0000-01-01"   # from_date that recomputes all of a user's entries
+
+
+def backfill_trend_values(conn):
+    """Backfill for migration 3: trend values and summaries of the entries logged before it."""
+    for (user_id,) in conn.execute(USERS_WITH_ENTRIES_SQL).fetchall():
+        recompute_trends(conn, user_id, FIRST_DATE)
+
+
+def update_trends(db, user_id, from_date):
+    """
+    Recompute a user's trend values from a date onwards and refresh their summary.
+
+    Call it in the same transaction as the write that changed the entries (it joins an open
+    transaction), with the earliest date the write touched.
+
+    Parameters:
+    db (Database): The application's database
+    user_id (int): Owner of the entries
+    from_date (str): Earliest changed date (YYYY-MM-DD)
+    """
+    with db.transaction() as conn:
+        recompute_trends(conn, user_id, from_date)
+
+
+def recompute_trends(conn, user_id, from_date):
+    """update_trends() on an open connection, e.g. in a migration step."""
+    # The trend continues from the last entry before the change, or starts at the first weight
+    previous = conn.execute(PREVIOUS_TREND_SQL, (user_id, from_date)).fetchone()
+    if previous is not None and previous[0] is None:
+        # Entries from before the trend analytics that were never backfilled: start over
+        from_date, previous = FIRST_DATE, None
+    trend = previous[0] if previous else None
+
+    updates = []
+    for entry_id, weight_kg in conn.execute(ENTRIES_FROM_SQL, (user_id, from_date)).fetchall():
+        trend = weight_kg if trend is None else trend + TREND_SMOOTHING * (weight_kg - trend)
+        updates.append((round(trend, 2), entry_id))
+    conn.executemany(UPDATE_TREND_SQL, updates)
+
+    refresh_summary(conn, user_id)
+
+
+def refresh_summary(conn, user_id):
+    """Rebuild a user's weight_trends row from the stored trend values (a few indexed lookups)."""
+    latest = conn.execute(LATEST_ENTRY_SQL, (user_id,)).fetchone()
+    if latest is None:
+        conn.execute(DELETE_SUMMARY_SQL, (user_id,))
+        return
+    window_start = (date.fromisoformat(latest[0]) - timedelta(days=MOVING_AVERAGE_DAYS)).isoformat()
+    reference = conn.execute(REFERENCE_ENTRY_SQL, (user_id, window_start)).fetchone()
+    if latest[1] is None or (reference is not None and reference[1] is None):
+        # Trend values missing (entries from before the trend analytics), compute them from the first entry
+        recompute_trends(conn, user_id, FIRST_DATE)
+        return
+
+    as_of, trend_kg = latest
+    as_of_date = date.fromisoformat(as_of)
+    average_7d_kg = conn.execute(RECENT_AVERAGE_SQL, (user_id, window_start, as_of)).fetchone()[0]
+
+    # Rate of change of the trend since the last entry at least a week before the latest one
+    weekly_rate_kg = projected_kg = projected_date = None
+    if reference is not None:
+        days = (as_of_date - date.fromisoformat(reference[0])).days
+        weekly_rate_kg = round((trend_kg - reference[1]) / days * 7, 2)
+        projected_kg = round(trend_kg + weekly_rate_kg * PROJECTION_DAYS / 7, 1)
+        projected_date = (as_of_date + timedelta(days=PROJECTION_DAYS)).isoformat()
+
+    conn.execute(UPSERT_SUMMARY_SQL, (user_id, as_of, trend_kg, round(average_7d_kg, 2),
+                                      weekly_rate_kg, projected_kg, projected_date))
+
+
+def get_trend_summary(db, user_id, unit_system):
+    """
+    Read a user's trend summary, converted to their unit system.
+
+    Returns:
+    dict: The summary with weights in kg or lb and 'unit', None if the user has no entries
+    """
+    rows = db.execute(SUMMARY_SQL, user_id)
+    if not rows:
+        return None
+
+    summary = rows[0]
+    factor = 1 / 0.453592 if unit_system == 'imperial' else 1
+    for key in ('trend_kg', 'average_7d_kg', 'weekly_rate_kg', 'projected_kg'):
+        value = summary.pop(key)
+        summary[key[:-3]] = None if value is None else round(value * factor, 1)
+    summary['unit'] = 'lb' if unit_system == 'imperial' else 'kg'
+    return summary
+
+
+def backfill_trends(db):
+    """
+    Recompute trend values and summaries for every user with weight entries.
+
+    Returns:
+    int: Number of users processed
+    """
+    user_ids = [row['id'] for row in db.execute(USERS_WITH_ENTRIES_SQL)]
+    for user_id in user_ids:
+        update_trends(db, user_id, FIRST_DATE)
+    return len(user_ids)
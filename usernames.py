@@ -0,0 +1,117 @@
+"""
+This module answers "is this username taken?" for the signup form without a query per keystroke.
+
+    - a Bloom filter holds every username: if it says "no", the name is definitely free and the
+      database isn't asked at all (the common case while someone types a new name)
+    - a small LRU remembers recent database answers for the names the filter can't rule out
+    - the unique index on users.username backs everything up, so a name can never be taken twice
+      even if two signups race or another worker process hasn't seen a new name yet
+
+The filter is filled from the users table at startup and every successful signup adds to it.
+Usernames are never renamed or deleted, so a "taken" answer never goes stale.
+"""
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+
+USERNAME_CACHE_SIZE = 1024      # recent database answers kept by the LRU
+BLOOM_ERROR_RATE = 0.01         # false positive rate the filter is sized for
+BLOOM_MIN_CAPACITY = 10000
+
+USERNAME_EXISTS_SQL = "SELECT 1 FROM users WHERE username = ?"
+ALL_USERNAMES_SQL = "SELECT username FROM users"
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings.
+
+    Parameters:
+    capacity (int): Number of items the filter is sized for
+    error_rate (float): False positive rate at that capacity
+    """
+
+    def __init__(self, capacity, error_rate=BLOOM_ERROR_RATE):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        # Double hashing: two 64-bit halves of one digest give all k positions
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class UsernameIndex:
+    """
+    Bloom filter + LRU in front of the users table.
+
+    Parameters:
+    db (Database): The application's database
+    cache_size (int): Database answers kept by the LRU
+    """
+
+    def __init__(self, db, cache_size=USERNAME_CACHE_SIZE):
+        self.db = db
+        self.cache_size = cache_size
+        self.stats = {"bloom_rejects": 0, "cache_hits": 0, "db_lookups": 0}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._bloom = BloomFilter(BLOOM_MIN_CAPACITY)
+
+    def warm(self):
+        """(Re)build the filter from every username in the database."""
+        usernames = [row['username'] for row in self.db.execute(ALL_USERNAMES_SQL)]
+        bloom = BloomFilter(max(BLOOM_MIN_CAPACITY, len(usernames) * 2))
+        for username in usernames:
+            bloom.add(username)
+        with self._lock:
+            # Names added while the table was being read are in the cache, carry them over
+            for username, exists in self._cache.items():
+                if exists:
+                    bloom.add(username)
+            self._bloom = bloom
+
+    def _remember(self, username, exists):
+        self._cache[username] = exists
+        self._cache.move_to_end(username)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def exists(self, username):
+        """Return True if a user with exactly this username exists."""
+        with self._lock:
+            if username not in self._bloom:
+                self.stats["bloom_rejects"] += 1
+                return False
+            if username in self._cache:
+                self.stats["cache_hits"] += 1
+                self._cache.move_to_end(username)
+                return self._cache[username]
+            self.stats["db_lookups"] += 1
+
+        exists = bool(self.db.execute(USERNAME_EXISTS_SQL, username))
+        with self._lock:
+            self._remember(username, exists)
+        return exists
+
+    def add(self, username):
+        """Record a newly created username, growing the filter once it's past its capacity."""
+        with self._lock:
+            self._bloom.add(username)
+            self._remember(username, True)
+            grow = self._bloom.count > self._bloom.capacity
+        if grow:
+            self.warm()
@@ -0,0 +1,353 @@
+"""
+This module validates FitHub's forms with declarative schemas.
+
+A schema is a list of rules that is built once at import time into a list of checks.
+Validating a form runs them on the raw form values and returns
+    - the typed values (floats, ints, dates, derived ages) of every field that passed, so routes
+      don't convert a second time
+    - the error messages, in the same order and wording as the old validate_* helpers
+
+Rules:
+    Text        copy raw strings into the values
+    Choice      value must be one of a fixed set
+    Required    all listed fields non-empty (extra fields per unit system)
+    Numbers     convert a group of fields with float / int, one message if any fails
+    Date        parse YYYY-MM-DD into a date
+    Derived     compute a value from other (valid) values, e.g. the age from the birthday
+    Check       predicate over valid values, message if it's false
+    InRange     low <= value <= high
+    When        nested rules that only run for one unit system
+"""
+from dates import age_on, parse_iso_date, today
+from helpers import (ACTIVITY_FACTORS, MAX_AGE, MAX_CM, MAX_FT, MAX_IN, MAX_KG, MAX_LB, MAX_TOTAL_IN, MIN_AGE, MIN_CM,
+                     MIN_FT, MIN_IN, MIN_KG, MIN_LB, MIN_TOTAL_IN)
+
+UNIT_SYSTEMS = frozenset(("metric", "imperial"))
+GENDERS = frozenset(("male", "female"))
+ACTIVITY_LEVELS = frozenset(ACTIVITY_FACTORS)
+
+# Messages shared by several forms
+ALL_FIELDS_REQUIRED = "All fields are required."
+INVALID_UNIT_SYSTEM = "Invalid unit system. Must be 'metric' or 'imperial'."
+NOT_NUMBERS = "Weight and height must be numbers."
+INVALID_BIRTHDAY = "Invalid date format. Please enter your birthday as YYYY-MM-DD."
+BODY_FAT_NOT_NUMBER = "Body fat percentage must be a number."
+BODY_FAT_RANGE = "Body fat percentage must be between 0 and 100."
+WEIGHT_RANGE_KG = f"Weight must be between {MIN_KG} kg and {MAX_KG} kg."
+WEIGHT_RANGE_LB = f"Weight must be between {MIN_LB} lb and {MAX_LB} lb."
+HEIGHT_RANGE_CM = f"Height must be between {MIN_CM} cm and {MAX_CM} cm."
+HEIGHT_RANGE_FT = f"Height feet value must be between {MIN_FT} ft and {MAX_FT} ft."
+HEIGHT_RANGE_IN = f"Height inches value must be between {MIN_IN} in and {MAX_IN} in."
+ENTRY_WEIGHT_RANGE_KG = f"Weight must be between {MIN_KG} and {MAX_KG} kg."
+ENTRY_WEIGHT_RANGE_LB = f"Weight must be between {MIN_LB} and {MAX_LB} lbs."
+
+
+# Every rule builds a check(get, unit_system, values, errors) once, when its schema is created: get is
+# raw.get, unit_system the raw form value, values and errors are filled in place. A check returns True
+# to stop the validation.
+
+
+class Text:
+    def __init__(self, *fields):
+        self.fields = fields
+
+    def build(self):
+        fields = self.fields
+
+        def check(get, unit_system, values, errors):
+            for field in fields:
+                values[field] = get(field)
+        return check
+
+
+class Choice:
+    def __init__(self, field, options, message):
+        self.field, self.options, self.message = field, frozenset(options), message
+
+    def build(self):
+        field, options, message = self.field, self.options, self.message
+
+        def check(get, unit_system, values, errors):
+            value = get(field)
+            if value in options:
+                values[field] = value
+            else:
+                errors.append(message)
+        return check
+
+
+class Required:
+    def __init__(self, *fields, metric=(), imperial=(), message=ALL_FIELDS_REQUIRED):
+        self.fields, self.metric, self.imperial, self.message = fields, metric, imperial, message
+
+    def build(self):
+        fields, message = self.fields, self.message
+        per_unit_system = {"metric": self.metric, "imperial": self.imperial}
+
+        def check(get, unit_system, values, errors):
+            required = fields + per_unit_system.get(unit_system, ())
+            if not all(get(field) for field in required):
+                errors.append(message)
+        return check
+
+
+class Numbers:
+    """Convert fields with `convert`, `optional` fields may be empty (-> None), `stop` ends the validation on failure."""
+
+    def __init__(self, *fields, message, convert=float, optional=False, stop=False):
+        self.fields, self.message, self.convert, self.optional, self.stop = fields, message, convert, optional, stop
+
+    def build(self):
+        fields, message, convert, optional, stop = self.fields, self.message, self.convert, self.optional, self.stop
+
+        def check(get, unit_system, values, errors):
+            converted = {}
+            try:
+                for field in fields:
+                    value = get(field)
+                    converted[field] = None if optional and (value is None or value == "") else convert(value)
+            except (TypeError, ValueError):
+                errors.append(message)
+                return stop
+            values.update(converted)
+        return check
+
+
+class Date:
+    """Strict YYYY-MM-DD, parsed with the memoized dates.parse_iso_date."""
+
+    def __init__(self, field, message):
+        self.field, self.message = field, message
+
+    def build(self):
+        field, message = self.field, self.message
+
+        def check(get, unit_system, values, errors):
+            try:
+                values[field] = parse_iso_date(get(field))
+            except (TypeError, ValueError):
+                errors.append(message)
+        return check
+
+
+def _valid(values, fields):
+    """The valid values of fields, None if one of them is missing."""
+    found = [values.get(field) for field in fields]
+    return None if None in found else found
+
+
+class Derived:
+    def __init__(self, name, fields, function):
+        self.name, self.fields, self.function = name, fields, function
+
+    def build(self):
+        name, fields, function = self.name, self.fields, self.function
+
+        def check(get, unit_system, values, errors):
+            found = _valid(values, fields)
+            if found is not None:
+                values[name] = function(*found)
+        return check
+
+
+class Check:
+    """Add `message` unless predicate(*values) holds, skipped if a field is missing / invalid / None."""
+
+    def __init__(self, fields, predicate, message):
+        self.fields = (fields,) if isinstance(fields, str) else fields
+        self.predicate, self.message = predicate, message
+
+    def build(self):
+        fields, predicate, message = self.fields, self.predicate, self.message
+
+        def check(get, unit_system, values, errors):
+            found = _valid(values, fields)
+            if found is not None and not predicate(*found):
+                errors.append(message)
+        return check
+
+
+class InRange:
+    """low <= value <= high."""
+
+    def __init__(self, field, low, high, message):
+        self.field, self.low, self.high, self.message = field, low, high, message
+
+    def build(self):
+        field, low, high, message = self.field, self.low, self.high, self.message
+
+        def check(get, unit_system, values, errors):
+            value = values.get(field)
+            if value is not None and not low <= value <= high:
+                errors.append(message)
+        return check
+
+
+class When:
+    """Rules for one unit system, `otherwise` rules run for any other (or an invalid) unit system."""
+
+    def __init__(self, unit_system, *rules, otherwise=()):
+        self.unit_system, self.rules, self.otherwise = unit_system, rules, otherwise
+
+    def build(self):
+        selected = self.unit_system
+        checks = [rule.build() for rule in self.rules]
+        otherwise = [rule.build() for rule in self.otherwise]
+
+        def check(get, unit_system, values, errors):
+            for nested in checks if unit_system == selected else otherwise:
+                if nested(get, unit_system, values, errors):
+                    return True
+        return check
+
+
+class Schema:
+    """
+    A form schema: the rules are built once, at import time, into a list of checks that
+    validate() runs in order.
+
+    Usage:
+        values, errors = SCHEMA.validate(request.form)
+    """
+
+    def __init__(self, *rules, name="schema"):
+        self.name = name
+        self.checks = [rule.build() for rule in rules]
+
+    def __repr__(self):
+        return f"<Schema {self.name}>"
+
+    def validate(self, raw):
+        """
+        Validate raw form values.
+
+        Parameters:
+        raw (dict): Field name -> string (request.form or a dict)
+
+        Returns:
+        tuple: (values, errors), the typed values of the fields that passed and the list of messages
+        """
+        values, errors = {}, []
+        get = raw.get
+        unit_system = get("unit_system")
+        for check in self.checks:
+            if check(get, unit_system, values, errors):
+                break
+        return values, errors
+
+
+# Body fat is optional on every form that has it
+BODY_FAT_RULES = (
+    Numbers("body_fat_percentage", message=BODY_FAT_NOT_NUMBER, optional=True),
+    InRange("body_fat_percentage", 0, 100, BODY_FAT_RANGE),
+)
+
+SIGNUP_SCHEMA = Schema(
+    Text("username", "password", "confirmed_password", "gender", "activity_level"),
+    Check(("password", "confirmed_password"), lambda password, confirmed: password == confirmed,
+          "Passwords do not match."),
+    Choice("unit_system", UNIT_SYSTEMS, INVALID_UNIT_SYSTEM),
+    Required("username", "password", "confirmed_password", "birthday", "gender", "activity_level",
+             metric=("current_weight_kg", "height_cm"), imperial=("current_weight_lb", "height_ft")),
+    Date("birthday", INVALID_BIRTHDAY),
+    Derived("age", ("birthday",), age_on),
+    Check("age", lambda age: age >= MIN_AGE, f"You must be at least {MIN_AGE} years old to sign up."),
+    Check("age", lambda age: age <= MAX_AGE, f"You cannot be more than {MAX_AGE} years old to sign up."),
+    When("metric",
+         Numbers("current_weight_kg", "height_cm", message=NOT_NUMBERS),
+         InRange("current_weight_kg", MIN_KG, MAX_KG, WEIGHT_RANGE_KG),
+         InRange("height_cm", MIN_CM, MAX_CM, HEIGHT_RANGE_CM)),
+    When("imperial",
+         Numbers("current_weight_lb", "height_ft", "height_in", message=NOT_NUMBERS),
+         InRange("current_weight_lb", MIN_LB, MAX_LB, WEIGHT_RANGE_LB),
+         InRange("height_ft", MIN_FT, MAX_FT, HEIGHT_RANGE_FT),
+         InRange("height_in", MIN_IN, MAX_IN, HEIGHT_RANGE_IN)),
+    *BODY_FAT_RULES,
+    name="signup",
+)
+
+CALORIEHUB_SCHEMA = Schema(
+    Choice("unit_system", UNIT_SYSTEMS, INVALID_UNIT_SYSTEM),
+    Required("age", "gender", "activity_level",
+             metric=("weight_kg", "height_cm"), imperial=("weight_lb", "height_ft", "height_in")),
+    Numbers("age", message="Invalid age value.", convert=int),
+    InRange("age", MIN_AGE, MAX_AGE, f"Age must be between {MIN_AGE} and {MAX_AGE}."),
+    Choice("gender", GENDERS, "Invalid gender. Must be 'male' or 'female'."),
+    Choice("activity_level", ACTIVITY_LEVELS, "Invalid activity level."),
+    When("metric",
+         Numbers("weight_kg", "height_cm", message=NOT_NUMBERS),
+         InRange("weight_kg", MIN_KG, MAX_KG, WEIGHT_RANGE_KG),
+         InRange("height_cm", MIN_CM, MAX_CM, HEIGHT_RANGE_CM)),
+    When("imperial",
+         Numbers("weight_lb", "height_ft", "height_in", message=NOT_NUMBERS),
+         InRange("weight_lb", MIN_LB, MAX_LB, WEIGHT_RANGE_LB),
+         InRange("height_ft", MIN_FT, MAX_FT, HEIGHT_RANGE_FT),
+         InRange("height_in", MIN_IN, MAX_IN, HEIGHT_RANGE_IN)),
+    *BODY_FAT_RULES,
+    name="caloriehub",
+)
+
+SETTINGS_SCHEMA = Schema(
+    Required("unit_system", "birthday", "gender", "activity_level",
+             metric=("current_weight_kg", "height_cm"), imperial=("current_weight_lb", "height_ft", "height_in")),
+    Choice("activity_level", ACTIVITY_LEVELS, "Invalid activity level selection."),
+    Choice("unit_system", UNIT_SYSTEMS, INVALID_UNIT_SYSTEM),
+    When("metric",
+         Numbers("current_weight_kg", "height_cm", message=NOT_NUMBERS),
+         InRange("current_weight_kg", MIN_KG, MAX_KG, WEIGHT_RANGE_KG),
+         InRange("height_cm", MIN_CM, MAX_CM, HEIGHT_RANGE_CM)),
+    When("imperial",
+         Numbers("current_weight_lb", "height_ft", "height_in", message=NOT_NUMBERS),
+         InRange("current_weight_lb", MIN_LB, MAX_LB, WEIGHT_RANGE_LB),
+         Derived("total_height_in", ("height_ft", "height_in"), lambda feet, inches: feet * 12 + inches),
+         InRange("total_height_in", MIN_TOTAL_IN, MAX_TOTAL_IN,
+                 f"Height must be between {MIN_TOTAL_IN} in and {MAX_TOTAL_IN} in.")),
+    Date("birthday", INVALID_BIRTHDAY),
+    Derived("age", ("birthday",), age_on),
+    Check("age", lambda age: age >= MIN_AGE, f"You must be at least {MIN_AGE} years old."),
+    Check("age", lambda age: age <= MAX_AGE, f"You cannot be more than {MAX_AGE} years old."),
+    Choice("gender", GENDERS, "Invalid gender selection."),
+    *BODY_FAT_RULES,
+    name="settings",
+)
+
+# Entry weights are checked in kg unless the unit system is imperial
+ENTRY_WEIGHT_RANGE = When("imperial", InRange("weight", MIN_LB, MAX_LB, ENTRY_WEIGHT_RANGE_LB),
+                          otherwise=(InRange("weight", MIN_KG, MAX_KG, ENTRY_WEIGHT_RANGE_KG),))
+
+# Weight entries (progresshub form, import rows): no range check possible without a number
+WEIGHT_ENTRY_SCHEMA = Schema(
+    Required("weight", "unit_system", "date_recorded"),
+    Choice("unit_system", UNIT_SYSTEMS, INVALID_UNIT_SYSTEM),
+    Date("date_recorded", "Invalid date format. Use YYYY-MM-DD."),
+    Check("date_recorded", lambda day: day <= today(), "Date cannot be in the future."),
+    Numbers("weight", message="Weight must be a numeric value.", stop=True),
+    ENTRY_WEIGHT_RANGE,
+    name="weight entry",
+)
+
+EDIT_ENTRY_SCHEMA = Schema(
+    Required("weight", "unit_system", "date_recorded"),
+    Choice("unit_system", UNIT_SYSTEMS, INVALID_UNIT_SYSTEM),
+    Date("date_recorded", "Invalid date format. Use YYYY-MM-DD."),
+    Check("date_recorded", lambda day: day <= today(), "Date cannot be in the future."),
+    Numbers("weight", message="Weight must be a numeric value.", stop=True),
+    ENTRY_WEIGHT_RANGE,
+    name="edit entry",
+)
+
+TRAININGHUB_SCHEMA = Schema(
+    Required("current_weight", "squat", "bench", "deadlift", "unit_system"),
+    Choice("unit_system", UNIT_SYSTEMS, INVALID_UNIT_SYSTEM),
+    Numbers("current_weight", "squat", "bench", "deadlift", message="All values must be numeric.", stop=True),
+    Check(("current_weight", "squat", "bench", "deadlift"),
+          lambda weight, squat, bench, deadlift: weight > 0 and min(squat, bench, deadlift) >= 0,
+          "Values cannot be negative."),
+    When("imperial", InRange("current_weight", MIN_LB, MAX_LB, ENTRY_WEIGHT_RANGE_LB),
+         otherwise=(InRange("current_weight", MIN_KG, MAX_KG, ENTRY_WEIGHT_RANGE_KG),)),
+    # Lifts and bodyweight are both in the user's unit system
+    Check(("current_weight", "squat", "bench", "deadlift"),
+          lambda weight, squat, bench, deadlift: max(squat, bench, deadlift) <= weight * 5,
+          "Strength values cannot be more than 5 times your body weight."),
+    name="traininghub",
+)